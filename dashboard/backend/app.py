@@ -1,9 +1,35 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import sqlite3
+import atexit
 import json
-from datetime import datetime
-from email_service import send_email
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from email_service import EmailQueue
+from spot_store import SpotStore
+from spot_stream import SpotEventStream, format_sse
+from mqtt_ingest import IngestPipeline
+from db import Database
+import history
+from occupancy_stats import OccupancyStats
+from sensor_filter import SensorFilter
+from topic_router import TopicRouter
+from layout import Layout
+from free_spots import FreeSpotIndex
+import sessions
+from store_sync import StoreRefresher
+from response_cache import ResponseCache
+import batch_ingest
+from reading_guard import ReadingGuard
+from sensor_health import SensorHealth, STATUS_STALE, STATUS_OFFLINE
+from tariff import Tariff, revenue_report
+from retention import RetentionManager
+import metrics
+from metrics import log_event
 
 # Importações condicionais para MQTT
 try:
@@ -19,20 +45,94 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)
 
+# Papel do processo: 'all' (tudo num processo, modo de desenvolvimento),
+# 'ingest' (dono da assinatura MQTT, das escritas da ingestão e dos emails)
+# ou 'api' (workers HTTP sem estado; ver launcher.py)
+ROLE = os.environ.get('ROLE', 'all')
+if ROLE not in ('all', 'ingest', 'api'):
+    raise ValueError(f"ROLE deve ser 'all', 'ingest' ou 'api', não {ROLE!r}")
+INGEST_PORT = int(os.environ.get('INGEST_PORT', 5001))  # /metrics e stats do processo de ingestão
+
 DB_FILE = 'parking.db'
-TOTAL_SPOTS = 2
+db = Database(DB_FILE)  # Pool de conexões (WAL, busy-timeout, retry)
+
+# Retenção do histórico: amostras brutas com mais de raw_days (e transições
+# com mais de transition_days) viram agregados por hora; agregados por hora
+# com mais de hourly_days viram diários. Com archive_dir, as linhas brutas
+# são exportadas (csv.gz ou parquet) antes de serem apagadas.
+RETENTION = {
+    'raw_days': 7,
+    'transition_days': 365,
+    'hourly_days': 90,
+    'batch_size': 2000,
+    'interval': 3600,
+    'archive_dir': None,
+    'archive_format': 'csv.gz'
+}
+retention = RetentionManager.from_config(db, RETENTION)
+spot_store = SpotStore()  # Estado das vagas servido pela API
+spot_stream = SpotEventStream(epoch=spot_store.epoch)  # Eventos de mudança para /api/stream
+STREAM_KEEPALIVE = 15  # segundos entre comentários de keep-alive
 spot_entry_time = {}
-client_sessions = {}  # {client_id: {vaga: str, start_time: datetime, paid: bool}}
+email_queue = EmailQueue()  # Envio de emails em background (outbox em disco)
+session_store = sessions.SessionStore(db)  # Sessões dos clientes (SQLite, sobrevivem a restart)
 
 # Configurações MQTT (baseadas no ESP32)
 MQTT_BROKER = 'broker.hivemq.com'
 MQTT_PORT = 1883
-MQTT_TOPIC_VAGA1 = '/vaga1/status'
-MQTT_TOPIC_VAGA2 = '/vaga2/status'
+
+# Rotas de tópicos, vagas e parsers vêm da seção 'mqtt' do config
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend_config.json')
+with open(CONFIG_FILE, encoding='utf-8') as f:
+    CONFIG = json.load(f)
+# Estacionamentos -> zonas -> vagas (seção 'layout'; sem ela, vagas A1..A<TOTAL_SPOTS>)
+layout = Layout.from_config(CONFIG, int(os.environ.get('TOTAL_SPOTS', 2)))
+TOTAL_SPOTS = len(layout)
+topic_router = TopicRouter.from_config(CONFIG, names=layout.names())
+ESP32_SPOTS = topic_router.dedicated_spots()
+tariff = Tariff.from_config(CONFIG)  # Preços (seção 'tariff' do config)
+
+# Filtro dos sensores: histerese em torno do antigo limiar de 1500 cm,
+# suavização sobre as últimas leituras e tempo mínimo antes de transicionar
+SENSOR_OCUPADO_ABAIXO = 1400
+SENSOR_LIVRE_ACIMA = 1600
+SENSOR_JANELA = 5
+SENSOR_SUAVIZACAO = 'median'  # 'median', 'ema' ou 'none'
+SENSOR_DWELL = 2.0  # segundos
+sensor_filter = SensorFilter(SENSOR_OCUPADO_ABAIXO, SENSOR_LIVRE_ACIMA,
+                             window=SENSOR_JANELA, smoothing=SENSOR_SUAVIZACAO,
+                             min_dwell=SENSOR_DWELL)
+
+# Leituras atrasadas/duplicadas são descartadas antes de tocar no banco
+reading_guard = ReadingGuard()
+
+# Sensor sem publicar por SENSOR_STALE_AFTER segundos fica 'stale' e, depois
+# de SENSOR_OFFLINE_AFTER, 'offline' (o firmware manda heartbeat a cada 60 s)
+SENSOR_STALE_AFTER = 150
+SENSOR_OFFLINE_AFTER = 600
+sensor_health = SensorHealth(SENSOR_STALE_AFTER, SENSOR_OFFLINE_AFTER)
+
+# Ingestão: fila limitada + thread escritora que agrupa leituras
+INGEST_QUEUE_SIZE = 10000
+INGEST_WINDOW = 0.05  # segundos de coalescência por lote
 
 # Variável global para cliente MQTT
 mqtt_client = None
 
+# Métricas expostas em /metrics (LOG_MODE/LOG_SAMPLE_RATE controlam os logs)
+MQTT_MESSAGES = metrics.counter(
+    'smart_parking_mqtt_messages_total', 'Mensagens MQTT decodificadas por tipo de tópico',
+    ('kind',))
+MQTT_PARSE_FAILURES = metrics.counter(
+    'smart_parking_mqtt_parse_failures_total', 'Mensagens MQTT com payload inválido',
+    ('kind',))
+DB_TRANSACTION_SECONDS = metrics.histogram(
+    'smart_parking_db_transaction_seconds', 'Tempo das escritas no banco por operação',
+    ('op',))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'smart_parking_http_request_seconds', 'Latência das rotas da API',
+    ('endpoint', 'method', 'status'))
+
 # ===============================
 # BANCO DE DADOS SUPER SIMPLES
 # ===============================
@@ -40,8 +140,30 @@ mqtt_client = None
 
 def init_db():
     """Cria tabela básica com campos extras para o frontend React"""
-    conn = sqlite3.connect(DB_FILE)
+    with db.transaction() as conn:
+        _criar_tabelas(conn)
+
+    # Carrega o estado em memória (as leituras da API não tocam no banco)
+    reload_spot_store()
+
+    # Recupera o horário de entrada das vagas que continuam ocupadas
+    with db.connection() as conn:
+        spot_entry_time.update(history.last_entries(conn))
 
+    # Sessões abertas ficam no banco; descarta as vencidas durante a parada
+    session_store.expire()
+    abertas = session_store.open_sessions()
+    if abertas:
+        print(f"🔁 {len(abertas)} sessão(ões) de cliente recuperada(s)")
+
+
+# Colunas do layout na tabela spots (para consultas SQL por estacionamento/zona)
+LAYOUT_COLUMNS = (('nome', 'TEXT'), ('lot', 'TEXT'), ('zone', 'TEXT'),
+                  ('level', 'INTEGER'), ('attributes', 'TEXT'))
+
+
+def _criar_tabelas(conn):
+    """Cria/migra o schema dentro da transação de init_db"""
     # Verifica se a tabela já existe
     cursor = conn.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='spots'")
@@ -62,6 +184,11 @@ def init_db():
             conn.execute(
                 'ALTER TABLE spots ADD COLUMN last_distance_update TEXT DEFAULT NULL')
             print("➕ Adicionada coluna 'last_distance_update' ao banco")
+
+        for coluna, tipo in LAYOUT_COLUMNS:
+            if coluna not in columns:
+                conn.execute(f'ALTER TABLE spots ADD COLUMN {coluna} {tipo} DEFAULT NULL')
+                print(f"➕ Adicionada coluna '{coluna}' ao banco")
     else:
         # Cria tabela nova com todas as colunas
         conn.execute('''
@@ -70,158 +197,268 @@ def init_db():
                 occupied INTEGER DEFAULT 0,
                 updated TEXT DEFAULT CURRENT_TIMESTAMP,
                 distancia INTEGER DEFAULT NULL,
-                last_distance_update TEXT DEFAULT NULL
+                last_distance_update TEXT DEFAULT NULL,
+                nome TEXT DEFAULT NULL,
+                lot TEXT DEFAULT NULL,
+                zone TEXT DEFAULT NULL,
+                level INTEGER DEFAULT NULL,
+                attributes TEXT DEFAULT NULL
             )
         ''')
         print("📄 Criada nova tabela 'spots'")
 
-    # Insere vagas se não existirem
-    for i in range(1, TOTAL_SPOTS + 1):
-        conn.execute(
-            'INSERT OR IGNORE INTO spots (spot, occupied) VALUES (?, 0)', (i,))
+    # Insere vagas do layout e atualiza nome/estacionamento/zona das existentes
+    conn.executemany('''
+        INSERT INTO spots (spot, occupied, nome, lot, zone, level, attributes)
+        VALUES (?, 0, ?, ?, ?, ?, ?)
+        ON CONFLICT(spot) DO UPDATE SET
+            nome = excluded.nome, lot = excluded.lot, zone = excluded.zone,
+            level = excluded.level, attributes = excluded.attributes
+        WHERE nome IS NOT excluded.nome OR lot IS NOT excluded.lot
+            OR zone IS NOT excluded.zone OR level IS NOT excluded.level
+            OR attributes IS NOT excluded.attributes
+    ''', layout.rows())
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_spots_zone ON spots (lot, zone)')
 
-    conn.commit()
-    conn.close()
+    # Log de transições e amostras de distância
+    history.create_schema(conn)
+    sessions.create_schema(conn)
 
 
 def get_spots():
-    """Retorna todas as vagas com dados completos"""
-    conn = sqlite3.connect(DB_FILE)
-
-    # Verifica quais colunas existem na tabela
-    cursor = conn.execute("PRAGMA table_info(spots)")
-    columns = [row[1] for row in cursor.fetchall()]
-
-    # Constrói query baseada nas colunas disponíveis
-    if 'distancia' in columns and 'last_distance_update' in columns:
-        # Tabela completa
-        cursor = conn.execute(
-            'SELECT spot, occupied, updated, distancia, last_distance_update FROM spots ORDER BY spot')
-        spots = []
-        for row in cursor:
-            spots.append({
-                'spot': row[0],
-                'occupied': bool(row[1]),
-                'updated': row[2],
-                'distancia': row[3],
-                'distance_updated': row[4]
-            })
-    else:
-        # Tabela antiga - só colunas básicas
-        cursor = conn.execute(
-            'SELECT spot, occupied, updated FROM spots ORDER BY spot')
-        spots = []
-        for row in cursor:
-            spots.append({
-                'spot': row[0],
-                'occupied': bool(row[1]),
-                'updated': row[2],
-                'distancia': None,
-                'distance_updated': None
-            })
-
-    conn.close()
-    return spots
+    """Retorna todas as vagas com dados completos (servidas da memória)"""
+    return spot_store.all()
 
 
 def toggle_spot(spot_num):
     """Alterna status de uma vaga"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.execute(
-        'SELECT occupied FROM spots WHERE spot = ?', (spot_num,))
-    current = cursor.fetchone()
-
-    if current:
-        new_status = 0 if current[0] else 1
-        conn.execute(
-            'UPDATE spots SET occupied = ?, updated = ? WHERE spot = ?',
-            (new_status, datetime.now().isoformat(), spot_num)
-        )
-        conn.commit()
-        conn.close()
-        return bool(new_status)
+    current = spot_store.get(spot_num)
+    if current is None:
+        return None
+
+    new_status = not current['occupied']
+    updated = datetime.now().isoformat()
+
+    _na_transacao(None, _gravar_ocupacao, spot_num, new_status, updated)
 
-    conn.close()
-    return None
+    spot_store.apply(spot_num, occupied=new_status, updated=updated)
+    return new_status
 
 
-def update_spot_from_esp32(spot_num, occupied, timestamp=None):
+def update_spot_from_esp32(spot_num, occupied, timestamp=None, conn=None, store=None):
+    """Aplica o estado vindo do ESP32; com conn, participa da transação do chamador.
+
+    Dentro da transação do chamador, ``store`` é o ``spot_store.pending()``
+    que ele aplica depois do COMMIT.
+    """
     if timestamp is None:
         timestamp = datetime.now().isoformat()
+    if store is None:
+        store = spot_store
 
-    now = datetime.fromisoformat(timestamp)
-    previous = None
+    current = store.get(spot_num)
+    previous = current['occupied'] if current else None
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.execute(
-        'SELECT occupied FROM spots WHERE spot = ?', (spot_num,))
-    current = cursor.fetchone()
+    if previous is not None and previous != occupied:
+        with DB_TRANSACTION_SECONDS.time('update_spot_from_esp32'):
+            _na_transacao(conn, _gravar_ocupacao, spot_num, occupied, timestamp)
+        # Entrada/permanência/email ficam no listener registrar_permanencia
+        store.apply(spot_num, occupied=bool(occupied), updated=timestamp)
+
+        log_event('transicao',
+                  f" ESP32: Vaga {spot_num} -> {'OCUPADA' if occupied else 'LIVRE'}",
+                  spot=spot_num, occupied=bool(occupied))
+
+
+def update_spot_status(spot, distance, conn=None, occupied=None, timestamp=None, store=None):
+    """Atualiza status da vaga baseado na distância.
+
+    Sem ``occupied``, o estado vem do filtro do sensor (histerese, suavização
+    e dwell). Com ``occupied`` já decidido, só a distância é registrada.
+    ``conn``/``store`` como em update_spot_from_esp32.
+    """
+    if store is None:
+        store = spot_store
+    current = store.get(spot)
+    if current is None:
+        return int(bool(occupied))
+
+    if occupied is None:
+        occupied = sensor_filter.update(spot, current['occupied'], distancia=distance)
+    occupied = int(occupied)
+
+    agora = timestamp or datetime.now().isoformat()
+
+    # Mudança de estado pela distância também é uma transição (histórico/email)
+    if current['occupied'] != bool(occupied):
+        update_spot_from_esp32(spot, bool(occupied), agora, conn=conn, store=store)
+
+    with DB_TRANSACTION_SECONDS.time('update_spot_status'):
+        _na_transacao(conn, _gravar_distancia, spot, occupied, distance, agora)
+    store.apply(spot, occupied=bool(occupied), updated=agora,
+                distancia=distance, distance_updated=agora)
+    return occupied
 
-    if current:
-        previous = bool(current[0])
 
-    if previous is not None and previous != occupied:
-        conn.execute(
-            'UPDATE spots SET occupied = ?, updated = ? WHERE spot = ?',
-            (int(occupied), timestamp, spot_num)
+# Statements reutilizados (ficam no cache de cada conexão do pool)
+SQL_UPDATE_OCUPACAO = 'UPDATE spots SET occupied = ?, updated = ? WHERE spot = ?'
+SQL_UPDATE_DISTANCIA = '''
+    UPDATE spots 
+    SET occupied = ?, updated = ?, distancia = ?, last_distance_update = ?
+    WHERE spot = ?
+'''
+
+
+def _na_transacao(conn, fn, *args):
+    """Executa fn(conn, *args) na transação do chamador ou em uma própria"""
+    if conn is None:
+        with db.transaction() as own_conn:
+            return fn(own_conn, *args)
+    return fn(conn, *args)
+
+
+def _gravar_ocupacao(conn, spot_num, occupied, timestamp):
+    conn.execute(SQL_UPDATE_OCUPACAO, (int(occupied), timestamp, spot_num))
+    history.record_transition(conn, spot_num, timestamp, occupied)
+
+
+def _gravar_distancia(conn, spot, occupied, distancia, timestamp):
+    conn.execute(SQL_UPDATE_DISTANCIA,
+                 (occupied, timestamp, distancia, timestamp, spot))
+    history.record_distance(conn, spot, timestamp, occupied, distancia)
+
+
+def aplicar_leituras(leituras):
+    """Grava um lote de leituras já coalescidas em uma única transação.
+
+    A memória (e com ela stream, emails e permanência) só recebe o lote
+    depois do COMMIT; um lote desfeito não deixa rastro fora do banco.
+    """
+    pendentes = spot_store.pending()
+    with DB_TRANSACTION_SECONDS.time('aplicar_leituras'), db.transaction() as conn:
+        for leitura in leituras:
+            spot = leitura['spot']
+            atual = pendentes.get(spot)
+            if atual is None:
+                continue
+            distancia = leitura.get('distancia')
+
+            # Debounce/histerese antes de qualquer escrita
+            occupied = leitura.get('occupied')
+            if not leitura.get('confirmado'):
+                occupied = sensor_filter.update(
+                    spot, atual['occupied'], occupied, distancia)
+
+            if occupied != atual['occupied']:
+                update_spot_from_esp32(spot, occupied, leitura.get('timestamp'),
+                                       conn=conn, store=pendentes)
+            if distancia is not None:
+                update_spot_status(spot, distancia, conn=conn, occupied=occupied,
+                                   timestamp=leitura.get('timestamp'), store=pendentes)
+
+    try:
+        pendentes.commit()
+    except Exception:
+        # Listener falhou no meio do lote: a memória volta a refletir o banco
+        reload_spot_store()
+        raise
+
+
+def reload_spot_store():
+    """Recarrega o estado em memória a partir do banco"""
+    with db.connection() as conn:
+        spot_store.load(conn.execute(
+            'SELECT spot, occupied, updated, distancia, last_distance_update FROM spots'))
+    occupancy_stats.load(spot_store.all())
+    free_spots.load(spot_store.all())
+    sensor_health.load(spot_store.all(), expected=ESP32_SPOTS)
+
+
+def formatar_vaga(spot):
+    """Formato de vaga usado por /api/spots e pelo stream"""
+    info = layout.get(spot['spot'])
+    return {
+        'id': spot['spot'],
+        'nome': layout.name_of(spot['spot']),
+        'status': 'occupied' if spot['occupied'] else 'free',
+        'lastUpdate': spot['updated'],
+        'distancia': spot['distancia'],
+        'esp32_controlled': spot['spot'] in ESP32_SPOTS,
+        'lot': info.lot if info is not None else None,
+        'zone': info.zone if info is not None else None,
+        'attributes': sorted(info.attributes) if info is not None else [],
+        'sensor': spot.get('sensor')
+    }
+
+
+occupancy_stats = OccupancyStats(layout.zone_of, layout.level_of)
+spot_store.add_listener(occupancy_stats.on_change)
+
+# Vagas livres por estacionamento/zona/atributo para a busca de vaga
+free_spots = FreeSpotIndex(layout)
+spot_store.add_listener(free_spots.on_change)
+
+
+def registrar_permanencia(anterior, atual):
+    """Horário de entrada, tempo de permanência e email de saída.
+
+    Roda como listener do store, então vale também para transições
+    escritas por outro processo e trazidas pelo StoreRefresher. Só o
+    processo de ingestão ('all'/'ingest') envia os emails.
+    """
+    if anterior is None or anterior['occupied'] == atual['occupied']:
+        return
+    spot_num = atual['spot']
+    now = datetime.fromisoformat(atual['updated']) if atual['updated'] else datetime.now()
+
+    if atual['occupied']:
+        spot_entry_time[spot_num] = now
+        log_event('entrada', f"Entrada vaga {spot_num}", spot=spot_num)
+        return
+
+    entrada = spot_entry_time.pop(spot_num, None)
+    if entrada:
+        tempo = now - entrada
+        minutos = max(1, int(tempo.total_seconds() / 60))
+        occupancy_stats.record_dwell(tempo.total_seconds())
+
+        if ROLE == 'api':
+            return
+        email_queue.enqueue(
+            "teste@mailhog.local",
+            f"Tempo de permanência - Vaga {spot_num}",
+            f"O veículo ficou {minutos} minutos estacionado na vaga {spot_num}."
         )
-        conn.commit()
 
-        if not previous and occupied:
-            spot_entry_time[spot_num] = now
-            print(f"Entrada vaga {spot_num}")
+        log_event('email_enfileirado',
+                  f"Email enfileirado Vaga {spot_num}: {minutos} minutos",
+                  spot=spot_num, minutos=minutos)
 
-        elif previous and not occupied:
-            entrada = spot_entry_time.pop(spot_num, None)
-            if entrada:
-                tempo = now - entrada
-                minutos = max(1, int(tempo.total_seconds() / 60))
 
-                send_email(
-                    "teste@mailhog.local",
-                    f"Tempo de permanência - Vaga {spot_num}",
-                    f"O veículo ficou {minutos} minutos estacionado na vaga {spot_num}."
-                )
+spot_store.add_listener(registrar_permanencia)
 
-                print(f"Email enviado Vaga {spot_num}: {minutos} minutos")
+# Fora do modo 'all', outros processos também escrevem no banco
+store_refresher = StoreRefresher(db, spot_store)
 
-        print(
-            f" ESP32: Vaga {spot_num} -> {'OCUPADA' if occupied else 'LIVRE'}")
 
-    conn.close()
+def publicar_transicao(anterior, atual):
+    """Publica no stream as vagas que mudaram de estado (ou de saúde do sensor)"""
+    if (anterior is None or anterior['occupied'] != atual['occupied']
+            or anterior.get('sensor') != atual.get('sensor')):
+        spot_stream.publish(formatar_vaga(atual))
 
 
-def update_spot_status(spot, distance):
-    """Atualiza status da vaga baseado na distância"""
-    THRESHOLD_OCUPADO = 1500
-    occupied = 1 if distance < THRESHOLD_OCUPADO else 0
+spot_store.add_listener(publicar_transicao)
 
-    conn = sqlite3.connect(DB_FILE)
 
-    # Verifica se as colunas de distância existem
-    cursor = conn.execute("PRAGMA table_info(spots)")
-    columns = [row[1] for row in cursor.fetchall()]
+def marcar_saude_do_sensor(spot_num, status):
+    """Leva o estado do sensor ao registro da vaga (payloads, cache e stream)"""
+    if spot_store.get(spot_num) is not None:
+        spot_store.apply(spot_num, sensor=status)
 
-    if 'distancia' in columns and 'last_distance_update' in columns:
-        # Atualiza com dados de distância
-        conn.execute('''
-            UPDATE spots 
-            SET occupied = ?, updated = CURRENT_TIMESTAMP, distancia = ?, last_distance_update = CURRENT_TIMESTAMP
-            WHERE spot = ?
-        ''', (occupied, distance, spot))
-    else:
-        # Atualização básica sem distância
-        conn.execute('''
-            UPDATE spots 
-            SET occupied = ?, updated = CURRENT_TIMESTAMP
-            WHERE spot = ?
-        ''', (occupied, spot))
-
-    conn.commit()
-    conn.close()
-    print(
-        f"📏 Sensor: Vaga {spot}, Distância {distance}cm (threshold {THRESHOLD_OCUPADO}) -> {'OCUPADA' if occupied else 'LIVRE'}")
-    return occupied
+
+sensor_health.add_listener(marcar_saude_do_sensor)
+spot_store.add_listener(sensor_health.on_change)
 
 # ===============================
 # MQTT CLIENT PARA ESP32
@@ -232,143 +469,77 @@ def on_mqtt_connect(client, userdata, flags, rc):
     """Callback quando conecta ao broker MQTT"""
     if rc == 0:
         print("✅ Conectado ao broker MQTT")
-        # Subscreve nos tópicos específicos dos ESP32
-        client.subscribe(MQTT_TOPIC_VAGA1)
-        client.subscribe(MQTT_TOPIC_VAGA2)
-        # Subscreve nos tópicos padrão para compatibilidade
-        client.subscribe('vaga/+/status')
-        client.subscribe('vaga/+/distancia')
+        # Uma única inscrição com todos os filtros do roteador
+        topicos = topic_router.subscriptions()
+        client.subscribe([(topico, 0) for topico in topicos])
         print(f"📡 Inscrito nos tópicos:")
-        print(f"   - {MQTT_TOPIC_VAGA1}")
-        print(f"   - {MQTT_TOPIC_VAGA2}")
-        print(f"   - vaga/+/status")
-        print(f"   - vaga/+/distancia")
+        for topico in topicos:
+            print(f"   - {topico}")
     else:
         print(f"❌ Falha na conexão MQTT. Código: {rc}")
 
 
-def on_mqtt_message(client, userdata, msg):
-    """Processa mensagens vindas do ESP32"""
+def parse_mqtt_message(topic, payload):
+    """Converte uma mensagem MQTT em leituras {spot, occupied, distancia, timestamp}"""
+    rota = topic_router.resolve(topic)
+    kind = topic_router.parser_for(rota, payload) or 'unrouted'
+    MQTT_MESSAGES.inc(kind)
     try:
-        topic = msg.topic
-        print(f"📨 MQTT recebido: {topic}")
-        print(f"📦 Payload: {msg.payload.decode()}")
-
-        # Processa dados do ESP32 vaga 1 (formato específico)
-        if topic == '/vaga1/status':
-            payload = json.loads(msg.payload.decode())
-            
-            distancia_atual = payload.get('distancia_atual', 0)
-            situacao = payload.get('situacao', '')
-            timestamp = payload.get('timestamp', datetime.now().isoformat())
-
-            # Prioriza o campo 'situacao' se vier como string
-            if isinstance(situacao, str):
-                situacao_lower = situacao.lower().strip()
-                if situacao_lower in ['ocupada', 'ocupado', 'occupied']:
-                    ocupado = True
-                    status_msg = "OCUPADA"
-                elif situacao_lower in ['liberada', 'liberado', 'livre', 'free']:
-                    ocupado = False
-                    status_msg = "LIVRE"
-                else:
-                    # Fallback para lógica de distância se situacao não for reconhecida
-                    THRESHOLD_OCUPADO = 1500  # cm
-                    ocupado = distancia_atual < THRESHOLD_OCUPADO
-                    status_msg = "OCUPADA" if ocupado else "LIVRE"
-                    print(f"⚠️ Situacao '{situacao}' não reconhecida, usando distância")
-            else:
-                # Lógica baseada na distância (fallback)
-                THRESHOLD_OCUPADO = 1500  # cm
-                ocupado = distancia_atual < THRESHOLD_OCUPADO
-                status_msg = "OCUPADA" if ocupado else "LIVRE"
-
-            print(f"🎯 ESP32 Vaga 1: situacao='{situacao}', distância={distancia_atual}cm -> {status_msg}")
-            update_spot_from_esp32(1, ocupado, timestamp)
-            
-            try:
-                update_spot_status(1, distancia_atual)
-            except Exception as e:
-                print(f"⚠️ Erro ao atualizar distância vaga 1: {e}")
-        
-        # Processa dados do ESP32 vaga 2 (formato específico)
-        elif topic == '/vaga2/status':
-            payload = json.loads(msg.payload.decode())
-            
-            distancia_atual = payload.get('distancia_atual', 0)
-            situacao = payload.get('situacao', '')
-            timestamp = payload.get('timestamp', datetime.now().isoformat())
-
-            # Prioriza o campo 'situacao' se vier como string
-            if isinstance(situacao, str):
-                situacao_lower = situacao.lower().strip()
-                if situacao_lower in ['ocupada', 'ocupado', 'occupied']:
-                    ocupado = True
-                    status_msg = "OCUPADA"
-                elif situacao_lower in ['liberada', 'liberado', 'livre', 'free']:
-                    ocupado = False
-                    status_msg = "LIVRE"
-                else:
-                    THRESHOLD_OCUPADO = 1500  # cm
-                    ocupado = distancia_atual < THRESHOLD_OCUPADO
-                    status_msg = "OCUPADA" if ocupado else "LIVRE"
-                    print(f"⚠️ Situacao '{situacao}' não reconhecida, usando distância")
-            else:
-                THRESHOLD_OCUPADO = 1500  # cm
-                ocupado = distancia_atual < THRESHOLD_OCUPADO
-                status_msg = "OCUPADA" if ocupado else "LIVRE"
-
-            print(f"🎯 ESP32 Vaga 2: situacao='{situacao}', distância={distancia_atual}cm -> {status_msg}")
-            update_spot_from_esp32(2, ocupado, timestamp)
-            
-            try:
-                update_spot_status(2, distancia_atual)
-            except Exception as e:
-                print(f"⚠️ Erro ao atualizar distância vaga 2: {e}")
-
-        # Processa tópicos padrão MQTT: vaga/A1/status, vaga/A2/status, etc.
-        elif topic.startswith('vaga/'):
-            parts = topic.split('/')
-            if len(parts) >= 3:
-                vaga_nome = parts[1]  # A1, A2, etc.
-                tipo = parts[2]       # status ou distancia
-                
-                # Mapeia nome da vaga para número
-                vaga_num = None
-                if vaga_nome == 'A1':
-                    vaga_num = 1
-                elif vaga_nome == 'A2':
-                    vaga_num = 2
-                
-                if vaga_num and tipo == 'status':
-                    payload_str = msg.payload.decode()
-                    
-                    # Normaliza o status recebido
-                    payload_lower = payload_str.lower().strip()
-                    if payload_lower in ['ocupada', 'ocupado', 'occupied', '1']:
-                        ocupado = True
-                        status_msg = "OCUPADA"
-                    elif payload_lower in ['liberada', 'liberado', 'livre', 'free', '0']:
-                        ocupado = False
-                        status_msg = "LIVRE"
-                    else:
-                        print(f"⚠️ Status desconhecido para {vaga_nome}: {payload_str}")
-                        return
-                    
-                    print(f"🎯 MQTT {vaga_nome}: {payload_str} -> {status_msg}")
-                    update_spot_from_esp32(vaga_num, ocupado)
-                
-                elif vaga_num and tipo == 'distancia':
-                    try:
-                        distancia = float(msg.payload.decode())
-                        update_spot_status(vaga_num, distancia)
-                    except ValueError:
-                        print(f"⚠️ Distância inválida para {vaga_nome}: {msg.payload.decode()}")
-
-    except json.JSONDecodeError:
-        print(f"❌ Erro ao decodificar JSON: {msg.payload.decode()}")
-    except Exception as e:
-        print(f"❌ Erro ao processar mensagem MQTT: {e}")
+        leituras = topic_router.parse_route(rota, payload)
+    except Exception:
+        MQTT_PARSE_FAILURES.inc(kind)
+        raise
+    if rota is not None and not leituras:
+        MQTT_PARSE_FAILURES.inc(kind)
+    return leituras
+
+
+def transicoes_pendentes():
+    """Candidatos do filtro que completaram o dwell sem nova leitura"""
+    return [{'spot': spot, 'occupied': estado, 'distancia': None,
+             'timestamp': None, 'confirmado': True}
+            for spot, estado in sensor_filter.due()]
+
+
+def admitir_leitura(leitura, lote=None):
+    """Toda leitura recebida conta como contato do sensor, mesmo se descartada"""
+    if spot_store.get(leitura['spot']) is not None:
+        sensor_health.seen(leitura['spot'])
+    return reading_guard.admit(leitura, lote)
+
+
+ingest = IngestPipeline(parse_mqtt_message, aplicar_leituras,
+                        maxsize=INGEST_QUEUE_SIZE, window=INGEST_WINDOW,
+                        tick=transicoes_pendentes, admit=admitir_leitura,
+                        commit=reading_guard.confirm)
+
+
+metrics.gauge_callback('smart_parking_ingest_queue_depth',
+                        'Mensagens MQTT aguardando a thread escritora',
+                        lambda: ingest.stats()['queue_depth'])
+metrics.counter_callback('smart_parking_ingest_dropped_total',
+                         'Mensagens MQTT descartadas com a fila cheia',
+                         lambda: ingest.dropped)
+metrics.counter_callback('smart_parking_readings_stale_total',
+                         'Leituras descartadas por serem mais antigas que a última aceita',
+                         lambda: reading_guard.stale)
+metrics.counter_callback('smart_parking_readings_duplicate_total',
+                         'Leituras descartadas por repetirem a última aceita',
+                         lambda: reading_guard.duplicates)
+metrics.gauge_callback('smart_parking_sensors_stale',
+                       'Sensores sem publicar há mais de SENSOR_STALE_AFTER segundos',
+                       lambda: sensor_health.count(STATUS_STALE))
+metrics.gauge_callback('smart_parking_sensors_offline',
+                       'Sensores sem publicar há mais de SENSOR_OFFLINE_AFTER segundos',
+                       lambda: sensor_health.count(STATUS_OFFLINE))
+metrics.gauge_callback('smart_parking_email_queue_depth',
+                       'Emails aguardando envio',
+                       lambda: email_queue.stats()['queue_depth'])
+
+
+def on_mqtt_message(client, userdata, msg):
+    """Enfileira mensagens vindas do ESP32 (processadas pela thread escritora)"""
+    ingest.submit(msg.topic, msg.payload)
 
 
 def setup_mqtt():
@@ -397,61 +568,182 @@ def setup_mqtt():
 # ===============================
 
 
+@app.before_request
+def iniciar_cronometro():
+    request.environ['smart_parking.inicio'] = time.perf_counter()
+
+
+@app.after_request
+def medir_latencia(response):
+    inicio = request.environ.get('smart_parking.inicio')
+    if inicio is not None:
+        # Rótulo pela regra ('/api/history/<int:spot>'), não pela URL concreta
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - inicio,
+                                     rule, request.method, response.status_code)
+    return response
+
+
 @app.route('/')
 def home():
     return jsonify({
         'message': 'Smart Parking System API - Backend para ESP32',
         'version': '1.0.0',
         'endpoints': {
-            'GET /api/spots': 'Lista todas as vagas',
+            'GET /api/spots': 'Lista todas as vagas (ETag; ?since=<versão> só as alteradas)',
             'POST /api/spots/<int>/toggle': 'Alterna status de uma vaga',
-            'GET /api/status': 'Estatísticas gerais'
+            'GET /api/status': 'Estatísticas gerais',
+            'POST /api/readings/batch': 'Lote de leituras de gateway (JSON ou NDJSON)',
+            'GET /api/stats': 'Ocupação por zona, janelas móveis e permanência média',
+            'GET /api/layout': 'Estacionamentos e zonas com vagas livres/total',
+            'GET /api/spots/free': 'Vaga livre mais próxima (?lot&zone&attribute)',
+            'GET /api/stream': 'Eventos de mudança das vagas (SSE)',
+            'GET /api/history[/<int>]': 'Histórico agregado (?bucket=minute|hour|day&start&end)',
+            'GET /api/revenue': 'Receita por dia e por vaga (?start&end&spot)',
+            'GET /api/ingest/stats': 'Fila e contadores da ingestão MQTT',
+            'GET /api/sensors/filter': 'Contadores do filtro de leituras',
+            'GET /api/sensors/health': 'Último contato e estado dos sensores (?status)',
+            'GET /api/email/stats': 'Fila de envio de emails',
+            'GET /api/retention/stats': 'Retenção e compactação do histórico',
+            'GET /api/client/sessions/stats': 'Sessões de clientes abertas',
+            'GET /api/sync/stats': 'Sincronização do estado entre processos',
+            'GET /api/cache/stats': 'Cache de respostas pré-serializadas',
+            'GET /metrics': 'Métricas no formato de texto do Prometheus'
         },
         'mqtt': {
             'broker': f"{MQTT_BROKER}:{MQTT_PORT}",
-            'topics': {
-                'vaga1': MQTT_TOPIC_VAGA1,
-                'vaga2': MQTT_TOPIC_VAGA2,
-                'standard': 'vaga/+/status, vaga/+/distancia'
-            },
+            'topics': topic_router.subscriptions(),
             'available': MQTT_AVAILABLE and mqtt_client is not None
         },
-        'total_spots': TOTAL_SPOTS
+        'total_spots': TOTAL_SPOTS,
+        'role': ROLE
     })
 
 
-@app.route('/api/spots')
-def api_spots():
-    spots = get_spots()
-    formatted_spots = []
+def versao_das_vagas():
+    """Token de versão do estado das vagas: '<epoch>.<versão>'"""
+    return f'{spot_store.epoch}.{spot_store.version}'
 
-    for spot in spots:
-        formatted_spots.append({
-            'id': spot['spot'],
-            'nome': f"A{spot['spot']}",
-            'status': 'occupied' if spot['occupied'] else 'free',
-            'lastUpdate': spot['updated'],
-            'distancia': spot['distancia'],
-            'esp32_controlled': spot['spot'] in [1, 2]
-        })
 
-    return jsonify(formatted_spots)
+def vagas_desde(since):
+    """(token, vagas, completo) com só as vagas alteradas depois de ``since``.
+
+    Versões de outro processo (outro worker, ou antes de um restart) não
+    servem de referência: nesse caso a lista completa é devolvida.
+    """
+    epoch, _, versao = since.partition('.')
+    if epoch == spot_store.epoch and versao.isdigit() and int(versao) <= spot_store.version:
+        atual, spots = spot_store.changed_since(int(versao))
+        return f'{spot_store.epoch}.{atual}', spots, False
+    token = versao_das_vagas()  # lida antes do snapshot: nunca mais nova que os dados
+    return token, get_spots(), True
+
+
+# Corpos JSON (e gzip) das rotas de leitura, válidos até a próxima escrita
+response_cache = ResponseCache(versao_das_vagas)
+
+
+def resposta_em_cache(chave, montar, versao=versao_das_vagas):
+    """Corpo pré-serializado da versão atual, com ETag/304 e gzip"""
+    # Uma leitura só: uma escrita no meio não pode dar ao 304 o ETag novo
+    atual = versao()
+    if request.if_none_match.contains(atual):
+        # Nada mudou: responde sem serializar nada
+        resposta = Response(status=304)
+        resposta.set_etag(atual)
+    else:
+        token, corpo, corpo_gzip = response_cache.get(chave, montar, versao)
+        if corpo_gzip is not None and 'gzip' in request.accept_encodings:
+            resposta = Response(corpo_gzip, mimetype='application/json')
+            resposta.headers['Content-Encoding'] = 'gzip'
+        else:
+            resposta = Response(corpo, mimetype='application/json')
+        resposta.set_etag(token)
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+
+def resposta_de_vagas(chave, formatar):
+    """Lista de vagas em cache, ou só as alteradas com ?since=<versão>"""
+    since = request.args.get('since')
+    if since is None:
+        return resposta_em_cache(chave, lambda: formatar(get_spots()))
+
+    token = versao_das_vagas()
+    if request.if_none_match.contains(token):
+        resposta = Response(status=304)
+    else:
+        token, spots, completo = vagas_desde(since)
+        resposta = jsonify({'version': token, 'full': completo,
+                            'spots': formatar(spots)})
+    resposta.set_etag(token)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+
+@app.route('/api/spots')
+def api_spots():
+    return resposta_de_vagas('spots', lambda spots: [formatar_vaga(spot) for spot in spots])
+
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events com as transições das vagas"""
+    last_id = spot_stream.parse_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+
+    def gerar():
+        cursor = last_id
+        pendentes = spot_stream.since(cursor) if cursor is not None else None
+        if pendentes is None:
+            # Cliente novo ou sem como retomar: envia o estado completo
+            cursor = spot_stream.last_id
+            snapshot = json.dumps([formatar_vaga(spot) for spot in get_spots()])
+            yield format_sse(snapshot, event='snapshot', event_id=spot_stream.event_id(cursor))
+            pendentes = spot_stream.since(cursor) or []
+
+        while True:
+            for event_id, data in pendentes:
+                yield format_sse(data, event='spot', event_id=spot_stream.event_id(event_id))
+                cursor = event_id
+            pendentes = spot_stream.wait(cursor, timeout=STREAM_KEEPALIVE)
+            if pendentes is None:
+                return
+            if not pendentes:
+                yield ': keep-alive\n\n'
+
+    return Response(gerar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 
 @app.route('/api/vagas')
 def api_vagas():
-    spots = get_spots()
+    return resposta_de_vagas('vagas', formatar_vagas_por_nome)
+
+
+def formatar_vagas_por_nome(spots):
     vagas = {}
 
     for spot in spots:
-        vaga_name = f"A{spot['spot']}"
+        vaga_name = layout.name_of(spot['spot'])
         vagas[vaga_name] = {
             'status': 'occupied' if spot['occupied'] else 'free',
             'lastUpdate': spot['updated'],
             'distancia': None
         }
 
-    return jsonify(vagas)
+    return vagas
+
+
+def vaga_do_cliente(vaga_id):
+    """'A12' -> 12, ou None se o nome não corresponder a uma vaga conhecida"""
+    spot_num = topic_router.spot_for_name(vaga_id)
+    if spot_num is None or spot_store.get(spot_num) is None:
+        return None
+    return spot_num
 
 
 @app.route('/api/client/occupy', methods=['POST'])
@@ -462,21 +754,23 @@ def client_occupy_spot():
     
     if not vaga_id:
         return jsonify({'error': 'vaga_id é obrigatório'}), 400
+
+    spot_num = vaga_do_cliente(vaga_id)
+    if spot_num is None:
+        return jsonify({'error': f'Vaga {vaga_id} não encontrada'}), 404
     
     # Registra sessão do cliente
-    client_sessions[client_id] = {
-        'vaga': vaga_id,
-        'start_time': datetime.now(),
-        'paid': False
-    }
+    try:
+        session = session_store.open(client_id, vaga_id, spot_num)
+    except sessions.SessionConflict:
+        return jsonify({'error': f'Vaga {vaga_id} já está em uso'}), 409
     
     # Atualiza banco para ocupada
-    spot_num = 1 if vaga_id == 'A1' else 2
     update_spot_from_esp32(spot_num, True)
     
     return jsonify({
         'message': f'Vaga {vaga_id} ocupada com sucesso',
-        'session': client_sessions[client_id]
+        'session': session
     })
 
 
@@ -484,23 +778,19 @@ def client_occupy_spot():
 def client_pay_and_release():
     data = request.get_json()
     client_id = data.get('client_id', 'default')
-    
-    if client_id not in client_sessions:
+
+    # Remove sessão
+    session_info = session_store.close(client_id)
+    if session_info is None:
         return jsonify({'error': 'Sessão não encontrada'}), 404
     
-    session = client_sessions[client_id]
-    
     # Calcula valor total
-    tempo_decorrido = datetime.now() - session['start_time']
-    horas = tempo_decorrido.total_seconds() / 3600
-    valor_total = 10 + (int(horas) * 2)  # R$ 10 + R$ 2 por hora
+    agora = datetime.now()
+    tempo_decorrido = agora - session_info['start_time']
+    valor_total = tariff.price(session_info['start_time'], agora)
     
     # Libera vaga
-    spot_num = 1 if session['vaga'] == 'A1' else 2
-    update_spot_from_esp32(spot_num, False)
-    
-    # Remove sessão
-    session_info = client_sessions.pop(client_id)
+    update_spot_from_esp32(session_info['spot'], False)
     
     return jsonify({
         'message': 'Pagamento realizado e vaga liberada',
@@ -512,13 +802,12 @@ def client_pay_and_release():
 
 @app.route('/api/client/session/<client_id>')
 def get_client_session(client_id):
-    if client_id in client_sessions:
-        session = client_sessions[client_id]
-        
+    session = session_store.get(client_id)
+    if session is not None:
         # Calcula valor atual
-        tempo_decorrido = datetime.now() - session['start_time']
-        horas = tempo_decorrido.total_seconds() / 3600
-        valor_atual = 10 + (int(horas) * 2)
+        agora = datetime.now()
+        tempo_decorrido = agora - session['start_time']
+        valor_atual = tariff.price(session['start_time'], agora)
         
         return jsonify({
             'session': session,
@@ -529,42 +818,318 @@ def get_client_session(client_id):
         return jsonify({'session': None})
 
 
+@app.route('/api/client/sessions/stats')
+def api_client_sessions_stats():
+    """Sessões abertas e contadores de abertura/encerramento/expiração"""
+    return jsonify(session_store.stats())
+
+
+@app.route('/api/readings/batch', methods=['POST'])
+def api_readings_batch():
+    """Lote de leituras de um gateway (array JSON ou NDJSON) em uma transação"""
+    if ROLE == 'api':
+        return encaminhar_para_ingestao()
+
+    try:
+        if request.mimetype in batch_ingest.NDJSON_MIMETYPES:
+            linhas = (linha.decode('utf-8') for linha in request.stream)
+            registros = batch_ingest.parse_ndjson(linhas)
+        else:
+            registros = json.loads(request.get_data())
+            if isinstance(registros, dict):
+                registros = registros.get('readings')
+    except ValueError as e:
+        return jsonify({'error': f'JSON inválido: {e}'}), 400
+
+    if not isinstance(registros, list):
+        return jsonify({'error': 'envie um array de leituras (ou {"readings": [...]})'}), 400
+    if len(registros) > batch_ingest.BATCH_MAX_READINGS:
+        return jsonify({'error': f'máximo de {batch_ingest.BATCH_MAX_READINGS} leituras por lote'}), 413
+
+    leituras, erros = batch_ingest.validar_leituras(
+        registros, topic_router.spot_for_name, lambda spot: spot_store.get(spot) is not None)
+
+    # Mais antigas que a última leitura aceita da vaga, ou repetidas, não entram
+    recentes = []
+    lote = {}
+    descartadas = {'stale': 0, 'duplicate': 0}
+    for leitura in leituras:
+        sensor_health.seen(leitura['spot'], min(
+            datetime.fromisoformat(leitura['timestamp']).timestamp(), time.time()))
+        motivo = reading_guard.check(leitura, lote)
+        if motivo is None:
+            recentes.append(leitura)
+        else:
+            descartadas[motivo] += 1
+
+    if recentes:
+        try:
+            aplicar_leituras(recentes)
+        except sqlite3.Error as e:
+            return jsonify({'error': f'Erro ao gravar o lote: {e}'}), 503
+        reading_guard.confirm(lote)
+
+    return jsonify({
+        'received': len(registros),
+        'applied': len(recentes),
+        'stale': descartadas['stale'],
+        'duplicate': descartadas['duplicate'],
+        'rejected': erros
+    }), 200 if recentes or not erros else 400
+
+
+def encaminhar_para_ingestao():
+    """Workers de API repassam o lote ao processo de ingestão (filtro, guarda,
+    transições pendentes e emails vivem só nele)"""
+    pedido = urllib.request.Request(
+        f'http://127.0.0.1:{INGEST_PORT}{request.full_path.rstrip("?")}',
+        data=request.get_data(), method='POST',
+        headers={'Content-Type': request.content_type or 'application/json'})
+    try:
+        with urllib.request.urlopen(pedido, timeout=30) as resposta:
+            return Response(resposta.read(), resposta.status,
+                            mimetype=resposta.headers.get_content_type())
+    except urllib.error.HTTPError as e:
+        return Response(e.read(), e.code, mimetype=e.headers.get_content_type())
+    except (urllib.error.URLError, OSError) as e:
+        return jsonify({'error': f'Processo de ingestão indisponível: {e}'}), 503
+
+
 @app.route('/api/status')
 def api_status():
-    spots = get_spots()
-    total_spots = len(spots)
-    occupied_spots = sum(1 for spot in spots if spot['occupied'])
-    free_spots = total_spots - occupied_spots
+    # Os contadores mudam depois da versão do store (no listener), então a
+    # versão desta entrada é a dos próprios contadores; timestamp = montagem
+    return resposta_em_cache('status', montar_status, versao_do_status)
 
-    return jsonify({
+
+def versao_do_status():
+    return f'{spot_store.epoch}.s{occupancy_stats.version}'
+
+
+def montar_status():
+    # Contadores mantidos a cada transição: O(1) independente do nº de vagas
+    counters = occupancy_stats.counters()
+    total_spots = counters['total_spots']
+    occupied_spots = counters['occupied_spots']
+
+    return {
         'total_spots': total_spots,
         'occupied_spots': occupied_spots,
-        'free_spots': free_spots,
+        'free_spots': counters['free_spots'],
         'occupancy_rate': round((occupied_spots / total_spots) * 100, 1) if total_spots > 0 else 0,
         'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.route('/api/stats')
+def api_stats():
+    """Contadores por zona e por nível e estatísticas em janela móvel (5 min, 1 h, 24 h)"""
+    stats = occupancy_stats.counters()
+    stats.update(occupancy_stats.rolling())
+    stats['timestamp'] = datetime.now().isoformat()
+    return jsonify(stats)
+
+
+@app.route('/api/layout')
+def api_layout():
+    """Estacionamentos e zonas com vagas livres/total"""
+    return jsonify({'lots': free_spots.summary(), 'timestamp': datetime.now().isoformat()})
+
+
+@app.route('/api/spots/free')
+def api_free_spot():
+    """Vaga livre mais próxima (?lot, ?zone, ?attribute=ev|accessible...)"""
+    lot = request.args.get('lot')
+    zone = request.args.get('zone')
+    attribute = request.args.get('attribute')
+    if zone is not None and lot is None:
+        if len(layout.lots) != 1:
+            return jsonify({'error': 'zone exige lot quando há mais de um estacionamento'}), 400
+        lot = layout.lots[0]['id']
+
+    spot_num = free_spots.nearest(lot, zone, attribute)
+    resposta = {'lot': lot, 'zone': zone, 'attribute': attribute,
+                'free': free_spots.free_count(lot, zone, attribute), 'spot': None}
+    if spot_num is not None:
+        spot = spot_store.get(spot_num)
+        if spot is not None:
+            resposta['spot'] = formatar_vaga(spot)
+    return jsonify(resposta)
+
+
+@app.route('/api/history')
+@app.route('/api/history/<int:spot>')
+def api_history(spot=None):
+    """Série de ocupação agregada por minuto/hora/dia"""
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in history.BUCKETS:
+        return jsonify({'error': f"bucket deve ser um de {list(history.BUCKETS)}"}), 400
+
+    try:
+        with db.connection() as conn:
+            series = history.query_buckets(
+                conn, bucket, request.args.get('start'), request.args.get('end'), spot)
+    except ValueError:
+        return jsonify({'error': 'start/end devem estar em formato ISO'}), 400
+
+    return jsonify({'spot': spot, 'bucket': bucket, 'series': series})
+
+
+@app.route('/api/revenue')
+def api_revenue():
+    """Receita das permanências encerradas, por dia e por vaga (?start&end&spot)"""
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.now()
+        start = (datetime.fromisoformat(request.args['start']) if 'start' in request.args
+                 else end - timedelta(days=7))
+        spot = request.args.get('spot', type=int)
+    except ValueError:
+        return jsonify({'error': 'start/end devem estar em formato ISO'}), 400
+
+    with db.connection() as conn:
+        stays = history.completed_stays(conn, start, end, spot)
+    report = revenue_report(tariff, stays, history.utc_offset())
+    report.update(start=start.isoformat(), end=end.isoformat(), spot=spot,
+                  tariff=tariff.describe())
+    return jsonify(report)
+
+
+@app.route('/api/ingest/stats')
+def api_ingest_stats():
+    """Profundidade da fila e contadores da ingestão MQTT"""
+    return jsonify(dict(ingest.stats(), guard=reading_guard.stats()))
+
+
+@app.route('/api/sensors/filter')
+def api_sensors_filter():
+    """Contadores do filtro por vaga (leituras, transições, suprimidas)"""
+    return jsonify({
+        'config': {
+            'occupy_below': sensor_filter.occupy_below,
+            'free_above': sensor_filter.free_above,
+            'window': sensor_filter.window,
+            'smoothing': sensor_filter.smoothing,
+            'min_dwell': sensor_filter.min_dwell
+        },
+        'spots': sensor_filter.stats()
     })
 
 
+@app.route('/api/sensors/health')
+def api_sensors_health():
+    """Último contato e estado de cada sensor (?status=ok|stale|offline)"""
+    status = request.args.get('status')
+    if status not in (None, 'ok', STATUS_STALE, STATUS_OFFLINE):
+        return jsonify({'error': "status deve ser 'ok', 'stale' ou 'offline'"}), 400
+    return jsonify(dict(sensor_health.stats(), sensors=sensor_health.report(status)))
+
+
+@app.route('/api/retention/stats')
+def api_retention_stats():
+    """Tamanho do banco e contadores da compactação do histórico"""
+    return jsonify(retention.stats())
+
+
+@app.route('/api/email/stats')
+def api_email_stats():
+    """Profundidade e contadores da fila de emails"""
+    return jsonify(email_queue.stats())
+
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """Entradas e acertos do cache de respostas"""
+    return jsonify(response_cache.stats())
+
+
+@app.route('/api/sync/stats')
+def api_sync_stats():
+    """Contadores do StoreRefresher (só ativo fora do modo 'all')"""
+    return jsonify(dict(store_refresher.stats(), role=ROLE))
+
+
+@app.route('/metrics')
+def api_metrics():
+    """Contadores e histogramas no formato de texto do Prometheus"""
+    return Response(metrics.REGISTRY.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 # ===============================
 # INICIALIZAÇÃO
 # ===============================
-if __name__ == '__main__':
-    print("🚀 SMART PARKING - INTEGRAÇÃO ESP32")
-    print("=" * 50)
+
+
+def iniciar(mqtt=True):
+    """Sobe os serviços de background conforme o ROLE do processo.
+
+    Com ``mqtt=False`` a assinatura fica por conta de quem chamou (ex.:
+    async_runtime). A thread escritora da ingestão sobe sempre, mesmo sem
+    paho: ela também aplica as transições pendentes do filtro (tick).
+    """
+    if metrics.LOG_MODE == 'sampled':
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
 
     # Inicializa banco de dados
     init_db()
     print(f"✅ Banco de dados: {DB_FILE}")
     print(f"🅿️ Vagas configuradas: {TOTAL_SPOTS}")
 
+    if ROLE != 'all':
+        # Escritas de outros processos chegam ao store (e ao SSE) por aqui
+        store_refresher.start()
+        atexit.register(store_refresher.stop)
+
+    # Cada processo acompanha os sensores a partir do próprio store
+    sensor_health.start()
+    atexit.register(sensor_health.stop)
+
+    if ROLE == 'api':
+        return
+
+    # Emails de permanência saem por uma fila em background
+    email_queue.start()
+    atexit.register(email_queue.stop)
+
+    # Varredura periódica das sessões abandonadas
+    session_store.start()
+    atexit.register(session_store.stop)
+
+    # Compactação do histórico antigo (só no processo que escreve)
+    retention.start()
+    atexit.register(retention.stop)
+
+    # Thread escritora: fila MQTT e transições que completam o dwell
+    ingest.start()
+
     # Configura MQTT para ESP32
-    setup_mqtt()
+    if mqtt:
+        setup_mqtt()
+
+
+def criar_app():
+    """Fábrica usada pelo gunicorn nos workers de API ('app:criar_app()')"""
+    iniciar()
+    return app
 
-    print("🌐 Interface web: http://localhost:5000")
-    print("📡 API endpoints: /api/spots, /api/status")
-    print("🔌 Aguardando dados do ESP32...")
-    print("💡 Pressione Ctrl+C para parar")
+
+if __name__ == '__main__':
+    print(f"🚀 SMART PARKING - INTEGRAÇÃO ESP32 (ROLE={ROLE})")
     print("=" * 50)
 
-    # Inicia servidor Flask
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    iniciar()
+
+    if ROLE == 'ingest':
+        # Sem reloader: um único assinante MQTT; HTTP só para métricas/stats
+        print(f"📈 Métricas da ingestão: http://localhost:{INGEST_PORT}/metrics")
+        print("=" * 50)
+        app.run(host='127.0.0.1', port=INGEST_PORT, threaded=True)
+    else:
+        print("🌐 Interface web: http://localhost:5000")
+        print("📡 API endpoints: /api/spots, /api/status")
+        print("🔌 Aguardando dados do ESP32...")
+        print("💡 Pressione Ctrl+C para parar")
+        print("=" * 50)
+
+        # Inicia servidor Flask
+        app.run(debug=True, host='0.0.0.0', port=5000)
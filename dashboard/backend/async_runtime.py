@@ -0,0 +1,340 @@
+"""Runtime assíncrono opcional: API ASGI e assinatura MQTT com asyncio.
+
+As rotas são as mesmas do app.py: cada requisição HTTP comum roda o app
+Flask num pool de threads, fora do event loop, então o I/O bloqueante
+no SQLite não trava o loop. O /api/stream é servido direto no loop: um
+dashboard conectado custa uma corrotina, não uma thread. As mensagens
+MQTT chegam pelo aiomqtt (ou por qualquer fonte assíncrona, como o
+LocalBroker abaixo) e vão para a mesma fila de ingestão do app.py, cuja
+thread escritora grava no banco; os emails continuam na EmailQueue.
+
+Uso:
+    pip install uvicorn aiomqtt
+    python async_runtime.py --port 5000 [--broker localhost]
+    uvicorn async_runtime:asgi_app --port 5000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+# Importações condicionais para MQTT assíncrono
+try:
+    import aiomqtt
+    AIOMQTT_AVAILABLE = True
+except ImportError:
+    AIOMQTT_AVAILABLE = False
+
+import app as backend
+from spot_stream import format_sse
+
+WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 32))
+MQTT_RECONNECT_DELAY = 5.0  # segundos
+
+
+# -------- Ponte ASGI -> WSGI (rotas do Flask) --------
+
+def montar_environ(scope, corpo):
+    """Environ WSGI equivalente a um scope HTTP do ASGI"""
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': cliente[0],
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for nome, valor in scope['headers']:
+        nome = nome.decode('latin-1')
+        valor = valor.decode('latin-1')
+        if nome == 'content-type':
+            environ['CONTENT_TYPE'] = valor
+        elif nome != 'content-length':
+            chave = 'HTTP_' + nome.upper().replace('-', '_')
+            environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+
+def chamar_wsgi(wsgi_app, environ):
+    """Executa o app WSGI (numa thread do pool) e junta a resposta"""
+    resposta = {}
+
+    def start_response(status, headers, exc_info=None):
+        resposta['status'] = int(status.split(' ', 1)[0])
+        resposta['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                               for k, v in headers]
+
+    itens = wsgi_app(environ, start_response)
+    try:
+        corpo = b''.join(itens)
+    finally:
+        if hasattr(itens, 'close'):
+            itens.close()
+    return resposta['status'], resposta['headers'], corpo
+
+
+async def esperar_desconexao(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# -------- MQTT --------
+
+async def consumir_mensagens(mensagens):
+    """Entrega à fila de ingestão cada mensagem de um iterável assíncrono.
+
+    Serve para o ``client.messages`` do aiomqtt ou para um LocalBroker:
+    basta produzir objetos com ``topic`` e ``payload``.
+    """
+    async for msg in mensagens:
+        backend.ingest.submit(str(msg.topic), msg.payload)
+
+
+class LocalMessage:
+    __slots__ = ('topic', 'payload')
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class LocalBroker:
+    """Broker em memória para testes: ``publish`` de um lado, ``async for`` do outro"""
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._queue.put_nowait(LocalMessage(topic, payload))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+
+# -------- SSE no event loop --------
+
+class StreamHub:
+    """Acorda as conexões SSE do loop quando o SpotEventStream publica.
+
+    O publish acontece em outra thread (escritora da ingestão, pool WSGI);
+    ele só agenda a troca do asyncio.Event corrente, que acorda todos os
+    que esperam nele. O custo por publicação não depende de quantos
+    dashboards estão conectados.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._loop = None
+        self._evento = None
+
+    def bind(self, loop):
+        if self._loop is None:
+            self.stream.add_notifier(self._notificar)
+        self._loop = loop
+        self._evento = asyncio.Event()
+
+    def evento(self):
+        return self._evento
+
+    def _notificar(self):
+        self._loop.call_soon_threadsafe(self._acordar)
+
+    def _acordar(self):
+        evento, self._evento = self._evento, asyncio.Event()
+        evento.set()
+
+
+class AsyncRuntime:
+    """Aplicação ASGI com as rotas do app.py e a ingestão MQTT no mesmo loop"""
+
+    def __init__(self, wsgi_app=None, threads=WSGI_THREADS, broker=None, port=None,
+                 mqtt=True, mqtt_source=None):
+        self.wsgi_app = wsgi_app or backend.app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi-wsgi')
+        self.hub = StreamHub(backend.spot_stream)
+        self.broker = broker or backend.MQTT_BROKER
+        self.port = port or backend.MQTT_PORT
+        self.mqtt = mqtt
+        self.mqtt_source = mqtt_source
+        self._tasks = []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/api/stream' and scope['method'] == 'GET':
+                await self._stream(scope, receive, send)
+            else:
+                await self._wsgi(scope, receive, send)
+
+    # -------- Ciclo de vida --------
+
+    async def _lifespan(self, receive, send):
+        while True:
+            msg = await receive()
+            if msg['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif msg['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        loop = asyncio.get_running_loop()
+        self.hub.bind(loop)
+        # init_db e os serviços de background são bloqueantes: fora do loop
+        await loop.run_in_executor(self.executor, backend.iniciar, False)
+        if self.mqtt and backend.ROLE != 'api':
+            self._tasks.append(asyncio.create_task(self.mqtt_loop()))
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.get_running_loop().run_in_executor(self.executor, backend.ingest.stop)
+
+    async def mqtt_loop(self):
+        """Assina os tópicos do roteador e reconecta quando a conexão cai"""
+        if self.mqtt_source is not None:
+            await consumir_mensagens(self.mqtt_source)
+            return
+        if not AIOMQTT_AVAILABLE:
+            print("⚠️ aiomqtt não disponível. Instale com: pip install aiomqtt")
+            return
+
+        while True:
+            try:
+                async with aiomqtt.Client(self.broker, self.port) as client:
+                    topicos = backend.topic_router.subscriptions()
+                    await client.subscribe([(topico, 0) for topico in topicos])
+                    print(f"✅ Conectado ao broker MQTT (asyncio): {self.broker}:{self.port}")
+                    await consumir_mensagens(client.messages)
+            except aiomqtt.MqttError as e:
+                print(f"❌ Conexão MQTT perdida: {e}. Nova tentativa em {MQTT_RECONNECT_DELAY}s")
+                await asyncio.sleep(MQTT_RECONNECT_DELAY)
+
+    # -------- HTTP --------
+
+    async def _wsgi(self, scope, receive, send):
+        corpo = bytearray()
+        while True:
+            msg = await receive()
+            if msg['type'] == 'http.disconnect':
+                return
+            corpo += msg.get('body', b'')
+            if not msg.get('more_body'):
+                break
+
+        environ = montar_environ(scope, bytes(corpo))
+        status, headers, resposta = await asyncio.get_running_loop().run_in_executor(
+            self.executor, chamar_wsgi, self.wsgi_app, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': resposta})
+
+    async def _stream(self, scope, receive, send):
+        """Mesmo protocolo do /api/stream do app.py (snapshot, spot, keep-alive)"""
+        cabecalhos = dict(scope['headers'])
+        stream = backend.spot_stream
+        last_id = stream.parse_id(
+            cabecalhos.get(b'last-event-id', b'').decode('latin-1') or
+            parse_qs(scope['query_string'].decode('latin-1')).get('last_event_id', [None])[0])
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        async def enviar(texto):
+            await send({'type': 'http.response.body', 'body': texto.encode(), 'more_body': True})
+
+        desconexao = asyncio.ensure_future(esperar_desconexao(receive))
+        try:
+            cursor = last_id
+            if cursor is None or stream.since(cursor) is None:
+                # Cliente novo ou sem como retomar: envia o estado completo
+                cursor = stream.last_id
+                snapshot = json.dumps([backend.formatar_vaga(spot) for spot in backend.get_spots()])
+                await enviar(format_sse(snapshot, event='snapshot',
+                                        event_id=stream.event_id(cursor)))
+
+            while not desconexao.done():
+                # Pega o evento antes de consultar: um publish entre os dois o dispara
+                evento = self.hub.evento()
+                pendentes = stream.since(cursor)
+                if pendentes is None:
+                    break
+                if pendentes:
+                    await enviar(''.join(
+                        format_sse(data, event='spot', event_id=stream.event_id(event_id))
+                        for event_id, data in pendentes))
+                    cursor = pendentes[-1][0]
+                    continue
+
+                espera = asyncio.ensure_future(evento.wait())
+                feitos, _ = await asyncio.wait({espera, desconexao},
+                                               timeout=backend.STREAM_KEEPALIVE,
+                                               return_when=asyncio.FIRST_COMPLETED)
+                espera.cancel()
+                if not feitos:
+                    await enviar(': keep-alive\n\n')
+
+            if not desconexao.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            desconexao.cancel()
+
+
+asgi_app = AsyncRuntime()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--broker', default=backend.MQTT_BROKER)
+    parser.add_argument('--mqtt-port', type=int, default=backend.MQTT_PORT)
+    parser.add_argument('--no-mqtt', action='store_true', help='só a API, sem assinar o broker')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("⚠️ uvicorn não disponível. Instale com: pip install uvicorn")
+        sys.exit(1)
+
+    print(f"🚀 SMART PARKING - RUNTIME ASSÍNCRONO (ROLE={backend.ROLE})")
+    print("=" * 50)
+    runtime = AsyncRuntime(broker=args.broker, port=args.mqtt_port, mqtt=not args.no_mqtt)
+    uvicorn.run(runtime, host=args.host, port=args.port, lifespan='on', log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+
+from topic_router import normalizar_situacao, timestamp_local
+
+# ===============================
+# LOTES DE LEITURAS DOS GATEWAYS
+# ===============================
+
+BATCH_MAX_READINGS = 5000
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def parse_ndjson(linhas):
+    """Um registro JSON por linha (linhas vazias são ignoradas)"""
+    registros = []
+    for numero, linha in enumerate(linhas, 1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            registros.append(json.loads(linha))
+        except ValueError as e:
+            raise ValueError(f"linha {numero}: {e}") from None
+        if len(registros) > BATCH_MAX_READINGS:
+            break
+    return registros
+
+
+def _spot(valor, spot_for_name):
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, str):
+        return int(valor) if valor.isdigit() else spot_for_name(valor)
+    return None
+
+
+def validar_leituras(registros, spot_for_name, spot_exists):
+    """Valida e normaliza os registros de um lote numa única passada.
+
+    Cada registro é ``{spot, distancia_atual, situacao, timestamp, seq?}``; spot
+    pode ser o número ou o nome ('A12'). Retorna ``(leituras, erros)``,
+    com as leituras no formato da ingestão MQTT ordenadas por timestamp
+    (a ordem é estável para registros com o mesmo horário) e os erros como
+    ``{index, error}``.
+    """
+    leituras = []
+    erros = []
+    agora = datetime.now().isoformat()
+
+    for index, registro in enumerate(registros):
+        if not isinstance(registro, dict):
+            erros.append({'index': index, 'error': 'registro deve ser um objeto'})
+            continue
+
+        spot = _spot(registro.get('spot'), spot_for_name)
+        if spot is None or not spot_exists(spot):
+            erros.append({'index': index, 'error': f"vaga desconhecida: {registro.get('spot')!r}"})
+            continue
+
+        situacao = registro.get('situacao')
+        occupied = None
+        if situacao is not None:
+            occupied = normalizar_situacao(situacao)
+            if occupied is None:
+                erros.append({'index': index, 'error': f"situacao inválida: {situacao!r}"})
+                continue
+
+        distancia = registro.get('distancia_atual')
+        if distancia is not None:
+            if isinstance(distancia, bool) or not isinstance(distancia, (int, float)) or distancia < 0:
+                erros.append({'index': index, 'error': f"distancia_atual inválida: {distancia!r}"})
+                continue
+
+        if occupied is None and distancia is None:
+            erros.append({'index': index, 'error': 'situacao ou distancia_atual é obrigatório'})
+            continue
+
+        timestamp = registro.get('timestamp')
+        chegada = timestamp is None
+        if chegada:
+            timestamp = agora
+        else:
+            try:
+                timestamp = timestamp_local(timestamp)
+            except (TypeError, ValueError):
+                erros.append({'index': index, 'error': f"timestamp inválido: {timestamp!r}"})
+                continue
+
+        seq = registro.get('seq')
+        if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int)):
+            erros.append({'index': index, 'error': f"seq inválido: {seq!r}"})
+            continue
+
+        # Estado explícito não passa pelo dwell do filtro: o dwell conta tempo de
+        # chegada, e todas as leituras de um lote chegam no mesmo instante
+        leituras.append({'spot': spot, 'occupied': occupied, 'distancia': distancia,
+                         'timestamp': timestamp, 'timestamp_chegada': chegada, 'seq': seq,
+                         'confirmado': occupied is not None})
+
+    leituras.sort(key=lambda leitura: (leitura['timestamp'], leitura['seq'] or 0))
+    return leituras, erros
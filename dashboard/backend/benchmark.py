@@ -0,0 +1,262 @@
+"""Benchmark da ingestão MQTT e das rotas de leitura da API.
+
+Simula N ESP32 publicando nos formatos reais (JSON em /vaga<N>/status e
+texto puro em vaga/A<N>/status e vaga/A<N>/distancia), chamando o
+callback do paho diretamente, e M leitores HTTP concorrentes via test
+client do Flask (ou um servidor em --url). Roda num diretório
+temporário, sem tocar no parking.db real.
+
+Uso:
+    python benchmark.py --nodes 500 --rate 1 --seconds 10 --readers 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeMessage:
+    """Mensagem no formato que o paho entrega ao on_message"""
+    __slots__ = ('topic', 'payload')
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def percentis(amostras):
+    """p50/p95/p99/max em milissegundos"""
+    if not amostras:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordenadas = sorted(amostras)
+
+    def p(q):
+        return round(ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))] * 1000, 3)
+
+    return {'p50': p(0.50), 'p95': p(0.95), 'p99': p(0.99),
+            'max': round(ordenadas[-1] * 1000, 3)}
+
+
+def gerar_mensagem(spot, codificar=None):
+    """Uma leitura aleatória em um dos formatos publicados pelos ESP32"""
+    ocupada = random.random() < 0.5
+    distancia = random.randint(50, 1300) if ocupada else random.randint(1700, 4000)
+    formato = random.random()
+    if formato < 0.6 and codificar is not None:
+        # binary_payload.encode: mesmo tópico, registro de 16 bytes
+        payload = codificar(spot, ocupada, distancia, int(time.time()))
+        return FakeMessage(f'/vaga{spot}/status', payload)
+    if formato < 0.6:
+        payload = json.dumps({
+            'situacao': 'ocupada' if ocupada else 'liberada',
+            'distancia_atual': distancia,
+            'diferenca': random.randint(-400, 400),
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        return FakeMessage(f'/vaga{spot}/status', payload.encode())
+    if formato < 0.8:
+        return FakeMessage(f'vaga/A{spot}/status', b'ocupada' if ocupada else b'livre')
+    return FakeMessage(f'vaga/A{spot}/distancia', str(distancia).encode())
+
+
+def bench_ingest(app, nodes, rate, seconds, publishers, binario=False):
+    """Publica nodes*rate msgs/s por `seconds` e mede o pipeline"""
+    from mqtt_ingest import IngestPipeline
+    from binary_payload import encode
+
+    codificar = encode if binario else None
+
+    duracoes_lote = []
+
+    def aplicar_cronometrado(leituras):
+        inicio = time.perf_counter()
+        app.aplicar_leituras(leituras)
+        duracoes_lote.append(time.perf_counter() - inicio)
+
+    app.ingest = IngestPipeline(app.parse_mqtt_message, aplicar_cronometrado,
+                                maxsize=app.INGEST_QUEUE_SIZE, window=app.INGEST_WINDOW,
+                                tick=app.transicoes_pendentes, admit=app.admitir_leitura,
+                                commit=app.reading_guard.confirm)
+    app.ingest.start()
+
+    commits_antes = app.db.commits
+    changes_antes = app.db.total_changes()
+    latencias = [[] for _ in range(publishers)]
+    fim = time.monotonic() + seconds
+
+    def publicar(idx):
+        # Cada thread publica por um subconjunto dos nós, no ritmo alvo
+        spots = list(range(1 + idx, nodes + 1, publishers))
+        if not spots:
+            return
+        intervalo = 1.0 / (len(spots) * rate)
+        amostras = latencias[idx]
+        proximo = time.monotonic()
+        i = 0
+        while time.monotonic() < fim:
+            msg = gerar_mensagem(spots[i % len(spots)], codificar)
+            i += 1
+            inicio = time.perf_counter()
+            app.on_mqtt_message(None, None, msg)
+            amostras.append(time.perf_counter() - inicio)
+            proximo += intervalo
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=publicar, args=(i,)) for i in range(publishers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    publicado = time.monotonic() - inicio
+
+    # Espera a fila esvaziar para medir a vazão de ponta a ponta
+    while app.ingest.stats()['queue_depth'] > 0:
+        time.sleep(0.01)
+    app.ingest.stop()
+    total = time.monotonic() - inicio
+
+    stats = app.ingest.stats()
+    callback = [x for amostras in latencias for x in amostras]
+    return {
+        'nodes': nodes,
+        'target_msgs_per_s': nodes * rate,
+        'published': stats['received'],
+        'publish_msgs_per_s': round(stats['received'] / publicado, 1),
+        'processed_msgs_per_s': round(stats['processed'] / total, 1),
+        'dropped': stats['dropped'],
+        'parse_errors': stats['parse_errors'],
+        'batches': stats['batches'],
+        'coalesced': stats['coalesced'],
+        'callback_latency_ms': percentis(callback),
+        'batch_apply_latency_ms': percentis(duracoes_lote),
+        'db_commits': app.db.commits - commits_antes,
+        'db_rows_written': app.db.total_changes() - changes_antes
+    }
+
+
+def bench_http(app, readers, seconds, paths, url=None):
+    """Leitores concorrentes em loop fechado sobre as rotas de leitura"""
+    latencias = [[] for _ in range(readers)]
+    erros = [0] * readers
+    fim = time.monotonic() + seconds
+
+    def ler(idx):
+        client = app.app.test_client() if url is None else None
+        amostras = latencias[idx]
+        i = idx
+        while time.monotonic() < fim:
+            path = paths[i % len(paths)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                if client is not None:
+                    status = client.get(path).status_code
+                else:
+                    with urllib.request.urlopen(url + path) as resp:
+                        resp.read()
+                        status = resp.status
+            except Exception:
+                status = 0
+            amostras.append(time.perf_counter() - inicio)
+            if status != 200:
+                erros[idx] += 1
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=ler, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.monotonic() - inicio
+
+    todas = [x for amostras in latencias for x in amostras]
+    return {
+        'readers': readers,
+        'paths': paths,
+        'requests': len(todas),
+        'requests_per_s': round(len(todas) / total, 1),
+        'errors': sum(erros),
+        'latency_ms': percentis(todas)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=200, help='ESP32 virtuais (vagas)')
+    parser.add_argument('--rate', type=float, default=1.0, help='mensagens/s por nó')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duração de cada fase')
+    parser.add_argument('--publishers', type=int, default=4, help='threads publicando')
+    parser.add_argument('--readers', type=int, default=16, help='leitores HTTP concorrentes')
+    parser.add_argument('--paths', default='/api/spots,/api/status,/api/vagas')
+    parser.add_argument('--url', help='servidor já rodando (ex.: http://localhost:5000)')
+    parser.add_argument('--mixed', action='store_true',
+                        help='roda leitores HTTP durante a ingestão')
+    parser.add_argument('--binary', action='store_true',
+                        help='ESP32 virtuais publicam o payload binário em vez de JSON')
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args()
+
+    # Banco, outbox e config ficam isolados num diretório temporário
+    os.chdir(tempfile.mkdtemp(prefix='smart-parking-bench-'))
+    os.environ['TOTAL_SPOTS'] = str(args.nodes)
+    sys.path.insert(0, BACKEND_DIR)
+
+    import builtins
+    print_original = builtins.print
+    builtins.print = lambda *a, **k: None  # logs por mensagem distorcem a medição
+    try:
+        import app
+        from topic_router import DEFAULT_ROUTES, TopicRouter
+
+        rotas = [{'topic': f'/vaga{i}/status', 'spot': i, 'parser': 'esp32_json'}
+                 for i in range(1, args.nodes + 1)]
+        rotas += [r for r in DEFAULT_ROUTES if '+' in r['topic']]
+        app.topic_router = TopicRouter(routes=rotas)
+        app.init_db()
+
+        paths = [p for p in args.paths.split(',') if p]
+        resultado = {'directory': os.getcwd()}
+        if args.mixed:
+            leitores = {}
+            t = threading.Thread(target=lambda: leitores.update(
+                bench_http(app, args.readers, args.seconds, paths, args.url)))
+            t.start()
+            resultado['ingest'] = bench_ingest(
+                app, args.nodes, args.rate, args.seconds, args.publishers, args.binary)
+            t.join()
+            resultado['http'] = leitores
+        else:
+            resultado['ingest'] = bench_ingest(
+                app, args.nodes, args.rate, args.seconds, args.publishers, args.binary)
+            resultado['http'] = bench_http(app, args.readers, args.seconds, paths, args.url)
+    finally:
+        builtins.print = print_original
+
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+        return
+
+    print("📊 SMART PARKING - BENCHMARK")
+    print("=" * 50)
+    for fase, dados in resultado.items():
+        if not isinstance(dados, dict):
+            continue
+        print(f"[{fase}]")
+        for chave, valor in dados.items():
+            print(f"  {chave}: {valor}")
+    print("=" * 50)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import struct
+from datetime import datetime
+
+# ===============================
+# PAYLOAD BINÁRIO DOS SENSORES
+# ===============================
+
+# Registro de 16 bytes, little-endian (mesma ordem de memória do ESP32):
+#   B  header     BINARY_HEADER (nunca é o primeiro byte de um JSON/texto)
+#   B  flags      FLAG_*
+#   I  spot       número da vaga; 0 = vaga da rota do tópico
+#   H  distancia  leitura do sensor (vale com FLAG_DISTANCIA)
+#   I  timestamp  epoch UTC em segundos; 0 = horário de chegada
+#   I  seq        contador do firmware (vale com FLAG_SEQ)
+# Uma mensagem pode trazer vários registros concatenados (gateways).
+BINARY_HEADER = 0xB1
+RECORD = struct.Struct('<BBIHII')
+_HEADER_BYTE = bytes([BINARY_HEADER])
+
+FLAG_OCUPADA = 0x01   # estado da vaga (vale com FLAG_ESTADO)
+FLAG_ESTADO = 0x02    # sem ele, o filtro decide pela distância
+FLAG_DISTANCIA = 0x04
+FLAG_SEQ = 0x08
+
+
+def is_binary(payload):
+    return payload[:1] == _HEADER_BYTE
+
+
+def encode(spot=0, occupied=None, distancia=None, timestamp=0, seq=None):
+    """Um registro (para simuladores, gateways e testes de carga)"""
+    flags = 0
+    if occupied is not None:
+        flags |= FLAG_ESTADO | (FLAG_OCUPADA if occupied else 0)
+    if distancia is not None:
+        flags |= FLAG_DISTANCIA
+    if seq is not None:
+        flags |= FLAG_SEQ
+    return RECORD.pack(BINARY_HEADER, flags, spot, int(distancia or 0),
+                       int(timestamp or 0), seq or 0)
+
+
+def decode(spot, payload):
+    """Leituras {spot, occupied, distancia, timestamp, seq} dos registros.
+
+    ``spot`` é a vaga da rota (None em rotas sem vaga), usada nos
+    registros com spot 0. ValueError se o tamanho ou o header não baterem.
+    """
+    if not payload or len(payload) % RECORD.size:
+        raise ValueError(f"payload binário com {len(payload)} bytes "
+                         f"(esperado múltiplo de {RECORD.size})")
+
+    # Sem NTP o firmware manda 0: vale o horário de chegada, como no JSON
+    chegada = datetime.now().isoformat()
+    leituras = []
+    for header, flags, vaga, distancia, timestamp, seq in RECORD.iter_unpack(payload):
+        if header != BINARY_HEADER:
+            raise ValueError(f"header binário inválido: 0x{header:02x}")
+        vaga = vaga or spot
+        if vaga is None:
+            raise ValueError('registro binário sem vaga numa rota sem vaga')
+        leituras.append({
+            'spot': vaga,
+            'occupied': bool(flags & FLAG_OCUPADA) if flags & FLAG_ESTADO else None,
+            'distancia': distancia if flags & FLAG_DISTANCIA else None,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat() if timestamp else chegada,
+            'timestamp_chegada': not timestamp,
+            'seq': seq if flags & FLAG_SEQ else None
+        })
+    return leituras
@@ -0,0 +1,133 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# ===============================
+# CAMADA DE CONEXÕES SQLITE
+# ===============================
+
+# Pragmas aplicados a cada conexão nova
+PRAGMAS = (
+    'PRAGMA auto_vacuum=INCREMENTAL',  # só vale em banco novo (antes do WAL e das tabelas)
+    'PRAGMA journal_mode=WAL',      # leitores não bloqueiam o escritor
+    'PRAGMA synchronous=NORMAL',    # seguro com WAL, fsync só no checkpoint
+    'PRAGMA cache_size=-8000',      # ~8 MB de cache de páginas
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def is_lock_error(error):
+    """True para erros transitórios de concorrência (locked/busy)"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class Database:
+    """Pool de conexões SQLite persistentes, com WAL e retry em lock.
+
+    Cada thread pega uma conexão exclusiva do pool enquanto a usa e a
+    devolve em seguida, então a conexão (e o cache de statements
+    preparados do módulo sqlite3) sobrevive entre chamadas. Transações
+    começam com BEGIN IMMEDIATE: a disputa pelo lock de escrita acontece
+    antes de qualquer trabalho, e só esse passo (e o commit) é repetido.
+    """
+
+    def __init__(self, path, pool_size=8, busy_timeout=5.0, retries=5,
+                 retry_delay=0.05, cached_statements=256):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+        self.lock_retries = 0
+        self.commits = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # transações explícitas (BEGIN IMMEDIATE)
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self._pool_size:
+                self._created += 1
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._pool.get()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
+    def retry(self, fn, *args):
+        """Executa fn repetindo com backoff exponencial em 'database is locked'"""
+        for tentativa in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or tentativa == self.retries:
+                    raise
+                self.lock_retries += 1
+                delay = self.retry_delay * (2 ** tentativa)
+                time.sleep(delay + random.uniform(0, delay))
+
+    @contextmanager
+    def connection(self):
+        """Conexão do pool para leituras (autocommit)"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Transação de escrita com commit/rollback automáticos"""
+        conn = self._acquire()
+        try:
+            self.retry(conn.execute, 'BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            self.retry(conn.commit)
+            self.commits += 1
+        finally:
+            self._release(conn)
+
+    def total_changes(self):
+        """Linhas alteradas por todas as conexões do pool desde a abertura"""
+        with self._lock:
+            return sum(conn.total_changes for conn in self._all)
+
+    def close(self):
+        """Fecha todas as conexões do pool"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._created = 0
+            self._pool = queue.LifoQueue()
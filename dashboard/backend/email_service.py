@@ -1,19 +1,265 @@
+import heapq
+import json
+import os
+import queue
 import smtplib
+import threading
+import time
+import uuid
 from email.mime.text import MIMEText
 
-SMTP_HOST = "localhost"   # MailHog
-SMTP_PORT = 1025          # Porta SMTP do MailHog
+import metrics
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")   # MailHog
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 1025))     # Porta SMTP do MailHog
 FROM_EMAIL = "gitpentes@gmailc.om"
 
-def send_email(to_email, subject, body):
+# Fila de envio assíncrono
+OUTBOX_DIR = os.environ.get("EMAIL_OUTBOX_DIR", "email_outbox")
+EMAIL_BATCH_SIZE = 20        # mensagens por ciclo na mesma conexão SMTP
+EMAIL_MAX_ATTEMPTS = 5       # depois disso vai para OUTBOX_DIR/failed
+EMAIL_RETRY_DELAY = 2.0      # segundos; dobra a cada tentativa
+SMTP_IDLE_TIMEOUT = 30.0     # fecha a conexão ociosa após N segundos
+
+EMAIL_SEND_SECONDS = metrics.histogram(
+    'smart_parking_email_send_seconds', 'Tempo de envio SMTP por mensagem', ('result',))
+
+
+def _build_message(to_email, subject, body):
     msg = MIMEText(body, "plain", "utf-8")
     msg["Subject"] = subject
     msg["From"] = FROM_EMAIL
     msg["To"] = to_email
+    return msg
+
+
+def send_email(to_email, subject, body):
+    msg = _build_message(to_email, subject, body)
 
     try:
         with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
             server.sendmail(FROM_EMAIL, [to_email], msg.as_string())
             print(f" Email enviado para {to_email} (MailHog)")
     except Exception as e:
-        print(f" Erro ao enviar email: {e}")
\ No newline at end of file
+        print(f" Erro ao enviar email: {e}")
+
+
+class EmailQueue:
+    """Fila de saída de emails com worker(s) em background.
+
+    ``enqueue`` grava a mensagem no outbox em disco e a coloca na fila em
+    memória; o arquivo só é apagado depois do envio, então nada se perde
+    num restart ou crash: ``start`` recarrega o que ficou no outbox. A
+    conexão SMTP é reusada entre mensagens e lotes; falhas voltam para a
+    fila com backoff, e com o servidor fora do ar o worker espera o
+    backoff em vez de tentar conectar de novo a cada mensagem.
+    """
+
+    def __init__(self, host=None, port=None, outbox_dir=OUTBOX_DIR, workers=1,
+                 batch_size=EMAIL_BATCH_SIZE, max_attempts=EMAIL_MAX_ATTEMPTS,
+                 retry_delay=EMAIL_RETRY_DELAY, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.outbox_dir = outbox_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._running = False
+        self._lock = threading.Lock()  # enqueue x recuperação do outbox em start
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # -------- API --------
+
+    def enqueue(self, to_email, subject, body):
+        """Grava o email no outbox e o enfileira para envio em background.
+
+        Antes de ``start``, a mensagem fica só no outbox (``start`` a recupera).
+        """
+        item = {
+            'id': uuid.uuid4().hex,
+            'to': to_email,
+            'subject': subject,
+            'body': body,
+            'attempts': 0
+        }
+        with self._lock:
+            self._criar_outbox()
+            self._persist(item)
+            self.enqueued += 1
+            if self._running:
+                self._queue.put(item)
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._criar_outbox()
+
+            # Recupera mensagens que ficaram no outbox
+            pendentes = 0
+            for nome in sorted(os.listdir(self.outbox_dir)):
+                if nome.endswith('.json'):
+                    with open(os.path.join(self.outbox_dir, nome), encoding='utf-8') as f:
+                        self._queue.put(json.load(f))
+                    pendentes += 1
+        if pendentes:
+            print(f"📬 {pendentes} email(s) recuperado(s) do outbox")
+
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f'email-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Para os workers; o que não foi enviado continua no outbox"""
+        with self._lock:
+            self._running = False
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        while True:
+            try:
+                # Já estão no outbox; regrava para guardar as tentativas
+                self._persist(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried
+        }
+
+    # -------- Outbox em disco --------
+
+    def _criar_outbox(self):
+        if not os.path.isdir(os.path.join(self.outbox_dir, 'failed')):
+            os.makedirs(os.path.join(self.outbox_dir, 'failed'), exist_ok=True)
+
+    def _path(self, item, pasta=''):
+        return os.path.join(self.outbox_dir, pasta, f"{item['id']}.json")
+
+    def _persist(self, item):
+        path = self._path(item)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(item, f)
+        os.replace(tmp, path)
+
+    def _discard(self, item):
+        try:
+            os.remove(self._path(item))
+        except FileNotFoundError:
+            pass
+
+    # -------- Worker --------
+
+    def _run(self):
+        smtp = None
+        ultimo_uso = 0.0
+        retries = []  # heap de (quando, seq, item)
+        seq = 0
+        servidor_fora_ate = 0.0
+
+        while self._running:
+            agora = time.monotonic()
+            if agora < servidor_fora_ate:
+                # Servidor SMTP fora do ar: espera o backoff antes de reconectar
+                time.sleep(min(0.5, servidor_fora_ate - agora))
+                continue
+
+            batch = []
+            while retries and retries[0][0] <= agora and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(retries)[2])
+
+            espera = 0.5
+            if retries:
+                espera = max(0.0, min(espera, retries[0][0] - agora))
+            try:
+                if not batch:
+                    batch.append(self._queue.get(timeout=espera))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if not batch:
+                if smtp is not None and agora - ultimo_uso > self.idle_timeout:
+                    smtp = self._close(smtp)
+                continue
+
+            for indice, item in enumerate(batch):
+                msg = _build_message(item['to'], item['subject'], item['body'])
+                inicio = time.perf_counter()
+                try:
+                    try:
+                        if smtp is None:
+                            smtp = self._connect()
+                        smtp.sendmail(FROM_EMAIL, [item['to']], msg.as_string())
+                    except smtplib.SMTPServerDisconnected:
+                        # Conexão reusada fechada pelo servidor: reconecta uma vez
+                        smtp = None
+                        smtp = self._connect()
+                        smtp.sendmail(FROM_EMAIL, [item['to']], msg.as_string())
+                except Exception as e:
+                    EMAIL_SEND_SECONDS.observe(time.perf_counter() - inicio, 'error')
+                    sem_conexao = smtp is None
+                    smtp = self._close(smtp)
+                    item['attempts'] += 1
+                    delay = self.retry_delay * (2 ** (item['attempts'] - 1))
+                    if item['attempts'] >= self.max_attempts:
+                        self.failed += 1
+                        os.replace(self._path(item), self._path(item, 'failed'))
+                        print(f" Email para {item['to']} descartado após "
+                              f"{item['attempts']} tentativas: {e}")
+                    else:
+                        self.retried += 1
+                        self._persist(item)
+                        seq += 1
+                        heapq.heappush(retries, (time.monotonic() + delay, seq, item))
+
+                    if sem_conexao:
+                        # Não conectou: o resto do lote espera o mesmo backoff
+                        # sem contar tentativa (e sem outro timeout de conexão)
+                        servidor_fora_ate = time.monotonic() + delay
+                        for resto in batch[indice + 1:]:
+                            seq += 1
+                            heapq.heappush(retries, (servidor_fora_ate, seq, resto))
+                        break
+                    continue
+
+                EMAIL_SEND_SECONDS.observe(time.perf_counter() - inicio, 'ok')
+                self.sent += 1
+                self._discard(item)
+            ultimo_uso = time.monotonic()
+
+        # Mensagens aguardando retry voltam para a fila (stop grava no outbox)
+        for _, _, item in retries:
+            self._queue.put(item)
+        self._close(smtp)
+
+    def _connect(self):
+        return smtplib.SMTP(self.host, self.port, timeout=10)
+
+    @staticmethod
+    def _close(smtp):
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+        return None
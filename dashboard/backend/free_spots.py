@@ -0,0 +1,127 @@
+import heapq
+import threading
+
+# ===============================
+# ÍNDICE DE VAGAS LIVRES
+# ===============================
+
+
+class _FreeHeap:
+    """Heap de vagas livres de um grupo (zona, atributo...), por proximidade.
+
+    Vagas que ficam ocupadas não saem na hora: são descartadas quando
+    chegam ao topo. Cada vaga entra no heap no máximo uma vez (``membros``),
+    então o tamanho nunca passa do número de vagas do grupo.
+    """
+    __slots__ = ('heap', 'membros', 'livres')
+
+    def __init__(self):
+        self.heap = []
+        self.membros = set()
+        self.livres = 0
+
+
+class FreeSpotIndex:
+    """Vagas livres por estacionamento, zona e atributo (EV, acessível...).
+
+    Cada vaga participa dos grupos (lot, zone, atributo) com zona e
+    atributo opcionais — ex.: (principal, None, None) é o estacionamento
+    inteiro e (principal, 'B', 'ev') são os carregadores da zona B. Cada
+    grupo é um heap pela ordem de proximidade do layout: a vaga livre mais
+    próxima sai em O(1) amortizado, a contagem de livres em O(1) e uma
+    mudança de estado custa O(log n) por grupo da vaga. Mantido como
+    listener do SpotStore, sem consultar o banco nem varrer as vagas.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self._lock = threading.Lock()
+        self._livre = {}
+        self._grupos = {}
+
+        self._totais = {}
+        for info in layout:
+            for chave in ((info.lot, None), (info.lot, info.zone)):
+                self._totais[chave] = self._totais.get(chave, 0) + 1
+
+    def _chaves(self, info):
+        atributos = (None,) + tuple(info.attributes)
+        for atributo in atributos:
+            yield (None, None, atributo)
+            yield (info.lot, None, atributo)
+            yield (info.lot, info.zone, atributo)
+
+    def _grupo(self, chave):
+        grupo = self._grupos.get(chave)
+        if grupo is None:
+            grupo = self._grupos[chave] = _FreeHeap()
+        return grupo
+
+    def _marcar(self, spot, livre):
+        info = self.layout.get(spot)
+        if info is None or self._livre.get(spot) == livre:
+            return
+        anterior = self._livre.get(spot)
+        self._livre[spot] = livre
+
+        for chave in self._chaves(info):
+            grupo = self._grupo(chave)
+            if livre:
+                grupo.livres += 1
+                if spot not in grupo.membros:
+                    grupo.membros.add(spot)
+                    heapq.heappush(grupo.heap, (info.rank, spot))
+            elif anterior:
+                grupo.livres -= 1
+
+    def load(self, spots):
+        """Reconstrói o índice a partir de SpotStore.all()"""
+        with self._lock:
+            self._livre.clear()
+            self._grupos.clear()
+            for info in self.layout:
+                for chave in self._chaves(info):
+                    self._grupo(chave)
+            for spot in spots:
+                self._marcar(spot['spot'], not spot['occupied'])
+
+    def on_change(self, anterior, atual):
+        """Listener do SpotStore"""
+        if anterior is not None and bool(anterior['occupied']) == bool(atual['occupied']):
+            return
+        with self._lock:
+            self._marcar(atual['spot'], not atual['occupied'])
+
+    def nearest(self, lot=None, zone=None, attribute=None):
+        """Número da vaga livre mais próxima do grupo, ou None"""
+        with self._lock:
+            grupo = self._grupos.get((lot, zone, attribute))
+            if grupo is None:
+                return None
+            heap = grupo.heap
+            while heap and not self._livre.get(heap[0][1]):
+                grupo.membros.discard(heapq.heappop(heap)[1])
+            return heap[0][1] if heap else None
+
+    def free_count(self, lot=None, zone=None, attribute=None):
+        grupo = self._grupos.get((lot, zone, attribute))
+        return grupo.livres if grupo is not None else 0
+
+    def summary(self):
+        """Vagas livres/total por estacionamento e zona"""
+        totais = self._totais
+        lots = []
+        for lot in self.layout.lots:
+            lots.append({
+                'id': lot['id'],
+                'name': lot['name'],
+                'total': totais.get((lot['id'], None), 0),
+                'free': self.free_count(lot['id']),
+                'zones': [{
+                    'id': zona['id'],
+                    'level': zona['level'],
+                    'total': totais.get((lot['id'], zona['id']), 0),
+                    'free': self.free_count(lot['id'], zona['id'])
+                } for zona in lot['zones']]
+            })
+        return lots
@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+
+# ===============================
+# HISTÓRICO DE OCUPAÇÃO
+# ===============================
+
+# Log só de inserção: transições de estado e amostras de distância.
+# ts é epoch em segundos (horário local do servidor/ESP32) para que o
+# agrupamento em buckets seja aritmética inteira no próprio SQLite.
+# Eventos antigos são somados por hora (e depois por dia) nas tabelas
+# spot_events_hourly/daily pelo retention.RetentionManager.
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS spot_events (
+        id INTEGER PRIMARY KEY,
+        spot INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        kind INTEGER NOT NULL,
+        occupied INTEGER,
+        distancia REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_spot_events_spot_ts ON spot_events (spot, ts)',
+    'CREATE INDEX IF NOT EXISTS idx_spot_events_ts ON spot_events (ts)',
+    *(f'''
+    CREATE TABLE IF NOT EXISTS {tabela} (
+        spot INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        occupied_sum INTEGER NOT NULL,
+        distancia_sum REAL NOT NULL DEFAULT 0,
+        distancia_count INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (spot, ts)
+    ) WITHOUT ROWID
+    ''' for tabela in ('spot_events_hourly', 'spot_events_daily')),
+    'CREATE INDEX IF NOT EXISTS idx_spot_events_hourly_ts ON spot_events_hourly (ts)',
+    'CREATE INDEX IF NOT EXISTS idx_spot_events_daily_ts ON spot_events_daily (ts)',
+)
+
+EVENT_TRANSICAO = 0
+EVENT_DISTANCIA = 1
+
+BUCKETS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Maior permanência considerada ao parear entradas e saídas (cobrança)
+MAX_STAY = 7 * 86400
+
+SQL_INSERT_EVENT = ('INSERT INTO spot_events (spot, ts, kind, occupied, distancia) '
+                    'VALUES (?, ?, ?, ?, ?)')
+
+
+def create_schema(conn):
+    for sql in SCHEMA:
+        conn.execute(sql)
+
+
+def to_epoch(value):
+    """Converte datetime/ISO string em epoch inteiro"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+
+def utc_offset():
+    """Deslocamento do fuso local, para alinhar buckets diários à meia-noite local"""
+    return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+def record_transition(conn, spot, timestamp, occupied):
+    conn.execute(SQL_INSERT_EVENT,
+                 (spot, to_epoch(timestamp), EVENT_TRANSICAO, int(occupied), None))
+
+
+def record_distance(conn, spot, timestamp, occupied, distancia):
+    conn.execute(SQL_INSERT_EVENT,
+                 (spot, to_epoch(timestamp), EVENT_DISTANCIA, int(occupied), distancia))
+
+
+def last_entries(conn):
+    """{spot: datetime} da última entrada das vagas hoje ocupadas"""
+    cursor = conn.execute('''
+        SELECT s.spot, MAX(e.ts)
+        FROM spots s
+        JOIN spot_events e ON e.spot = s.spot
+        WHERE s.occupied = 1 AND e.kind = ? AND e.occupied = 1
+        GROUP BY s.spot
+    ''', (EVENT_TRANSICAO,))
+    return {spot: datetime.fromtimestamp(ts) for spot, ts in cursor}
+
+
+def last_event_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM spot_events').fetchone()[0]
+
+
+def changed_spots(conn, after_id):
+    """(último id, vagas com eventos depois de after_id), pela chave primária"""
+    ultimo = after_id
+    spots = set()
+    for event_id, spot in conn.execute(
+            'SELECT id, spot FROM spot_events WHERE id > ? ORDER BY id', (after_id,)):
+        ultimo = event_id
+        spots.add(spot)
+    return ultimo, spots
+
+
+def completed_stays(conn, start, end, spot=None):
+    """Permanências encerradas com saída em [start, end]: [(spot, entrada, saida)].
+
+    Cada entrada (transição para ocupada) é pareada com a transição seguinte
+    da mesma vaga; só contam os pares em que ela é uma saída. As entradas
+    são buscadas a partir de ``start - MAX_STAY`` para pegar estadias que
+    começaram antes do intervalo.
+    """
+    params = {
+        'start': to_epoch(start),
+        'end': to_epoch(end),
+        'desde': to_epoch(start) - MAX_STAY,
+        'transicao': EVENT_TRANSICAO
+    }
+    filtro_spot = ''
+    if spot is not None:
+        filtro_spot = 'AND spot = :spot'
+        params['spot'] = spot
+
+    return conn.execute(f'''
+        SELECT spot, ts, saida
+        FROM (
+            SELECT spot, ts, occupied,
+                   LEAD(ts) OVER (PARTITION BY spot ORDER BY ts, id) AS saida,
+                   LEAD(occupied) OVER (PARTITION BY spot ORDER BY ts, id) AS proximo
+            FROM spot_events
+            WHERE kind = :transicao AND ts >= :desde AND ts <= :end {filtro_spot}
+        )
+        WHERE occupied = 1 AND proximo = 0 AND saida >= :start
+        ORDER BY saida
+    ''', params).fetchall()
+
+
+def query_buckets(conn, bucket='hour', start=None, end=None, spot=None):
+    """Série agregada por bucket (minute/hour/day) calculada no SQLite.
+
+    Para cada bucket: taxa de ocupação (média de ``occupied`` nos eventos),
+    distância média, número de entradas e de amostras. Períodos já
+    compactados pela retenção vêm dos agregados por hora/dia, com a
+    resolução deles.
+    """
+    size = BUCKETS[bucket]
+    end = datetime.fromisoformat(end) if end else datetime.now()
+    start = datetime.fromisoformat(start) if start else end - timedelta(days=1)
+    offset = utc_offset()
+
+    params = {
+        'size': size,
+        'off': offset,
+        'start': to_epoch(start),
+        'end': to_epoch(end),
+        'transicao': EVENT_TRANSICAO
+    }
+    filtro_spot = ''
+    if spot is not None:
+        filtro_spot = 'AND spot = :spot'
+        params['spot'] = spot
+
+    agregados = ''.join(f'''
+            UNION ALL
+            SELECT ts, samples, occupied_sum, distancia_sum, distancia_count, entries
+            FROM {tabela}
+            WHERE ts >= :start AND ts <= :end {filtro_spot}''' for tabela in (
+        'spot_events_hourly', 'spot_events_daily'))
+
+    cursor = conn.execute(f'''
+        SELECT (ts + :off) - ((ts + :off) % :size) - :off AS bucket,
+               SUM(ocupadas) * 1.0 / SUM(amostras),
+               SUM(distancia) / NULLIF(SUM(distancias), 0),
+               SUM(entradas),
+               SUM(amostras)
+        FROM (
+            SELECT ts, 1 AS amostras, occupied AS ocupadas, distancia,
+                   distancia IS NOT NULL AS distancias,
+                   kind = :transicao AND occupied = 1 AS entradas
+            FROM spot_events
+            WHERE ts >= :start AND ts <= :end {filtro_spot}{agregados}
+        )
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', params)
+
+    return [{
+        't': datetime.fromtimestamp(b).isoformat(),
+        'occupancy_rate': round(ocupacao * 100, 1) if ocupacao is not None else None,
+        'distancia': round(distancia, 1) if distancia is not None else None,
+        'entries': entradas,
+        'samples': amostras
+    } for b, ocupacao, distancia, entradas, amostras in cursor]
@@ -0,0 +1,99 @@
+"""Sobe o backend em modo de produção multi-processo.
+
+Um único processo de ingestão (ROLE=ingest) é dono da assinatura MQTT,
+das escritas da ingestão, dos emails e da varredura de sessões. N workers
+de API sem estado (ROLE=api, gunicorn) servem as rotas HTTP a partir do
+mesmo parking.db em WAL; cada worker acompanha as escritas dos outros
+processos pelo StoreRefresher.
+
+Os workers rodam o async_runtime (uvicorn): cada /api/stream aberto é uma
+corrotina, e as threads ficam para as outras rotas. Sem uvicorn, caem no
+gthread, onde cada dashboard conectado prende uma thread.
+
+Uso:
+    python launcher.py --workers 4 --bind 0.0.0.0:5000
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Importações condicionais para os workers ASGI
+try:
+    import uvicorn
+    UVICORN_AVAILABLE = True
+except ImportError:
+    UVICORN_AVAILABLE = False
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='workers de API do gunicorn')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='threads por worker para as rotas HTTP comuns')
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--ingest-port', type=int, default=5001,
+                        help='porta local do /metrics do processo de ingestão')
+    args = parser.parse_args()
+
+    # O banco (DB_FILE relativo) fica no diretório de onde o launcher foi chamado
+    env = dict(os.environ, INGEST_PORT=str(args.ingest_port))
+    processos = []
+
+    print("🚀 SMART PARKING - MODO MULTI-PROCESSO")
+    print("=" * 50)
+
+    # Ingestão primeiro: cria/migra o schema antes dos workers
+    processos.append(subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'app.py')],
+        env=dict(env, ROLE='ingest')))
+    time.sleep(1.0)
+
+    if UVICORN_AVAILABLE:
+        # /api/stream no event loop; as demais rotas no pool de ASYNC_WSGI_THREADS
+        worker = ['--worker-class', 'uvicorn.workers.UvicornWorker', 'async_runtime:asgi_app']
+        env_api = dict(env, ROLE='api', ASYNC_WSGI_THREADS=str(args.threads))
+    else:
+        print("⚠️ uvicorn não disponível (pip install uvicorn): workers gthread, "
+              "cada /api/stream aberto ocupa uma thread")
+        worker = ['--worker-class', 'gthread', '--threads', str(args.threads), 'app:criar_app()']
+        env_api = dict(env, ROLE='api')
+
+    processos.append(subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn',
+         '--pythonpath', BACKEND_DIR,
+         '--workers', str(args.workers),
+         '--bind', args.bind] + worker,
+        env=env_api))
+
+    print(f"🌐 API: http://{args.bind} ({args.workers} workers"
+          f"{', uvicorn' if UVICORN_AVAILABLE else ', gthread'})")
+    print(f"📈 Ingestão: http://localhost:{args.ingest_port}/metrics")
+    print("💡 Pressione Ctrl+C para parar")
+    print("=" * 50)
+
+    def encerrar(*_):
+        for processo in processos:
+            if processo.poll() is None:
+                processo.terminate()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    try:
+        # Se um dos lados cair, derruba o outro
+        while all(processo.poll() is None for processo in processos):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        encerrar()
+        for processo in processos:
+            processo.wait()
+
+
+if __name__ == '__main__':
+    main()
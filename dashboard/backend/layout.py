@@ -0,0 +1,111 @@
+import json
+
+# ===============================
+# ESTACIONAMENTOS, ZONAS E VAGAS
+# ===============================
+
+DEFAULT_LOT = 'principal'
+DEFAULT_ZONE = 'A'
+
+
+class SpotInfo:
+    """Dados fixos de uma vaga (vindos do layout, não do sensor)"""
+    __slots__ = ('spot', 'name', 'lot', 'zone', 'level', 'rank', 'attributes')
+
+    def __init__(self, spot, name, lot, zone, level, rank, attributes):
+        self.spot = spot
+        self.name = name
+        self.lot = lot
+        self.zone = zone
+        self.level = level
+        self.rank = rank              # ordem de proximidade no estacionamento
+        self.attributes = attributes  # frozenset, ex.: {'ev', 'accessible'}
+
+
+class Layout:
+    """Hierarquia estacionamento -> zona -> vaga montada a partir do config.
+
+    Formato da seção 'layout' do frontend_config.json::
+
+        {"lots": [{"id": "principal", "name": "Estacionamento Principal",
+                   "zones": [{"id": "A", "level": 0, "first_spot": 1,
+                              "count": 20, "prefix": "A",
+                              "attributes": [],
+                              "spot_attributes": {"A1": ["ev"]}}]}]}
+
+    Os números das vagas (chave no banco e nos tópicos) são globais; o nome
+    é ``prefix`` + posição na zona. A ordem das zonas e das vagas no
+    config é a ordem de proximidade usada na busca por vaga livre. Sem a
+    seção, o layout é uma zona 'A' com as vagas 1..total_spots (A1, A2...).
+    """
+
+    def __init__(self, lots):
+        self.lots = []
+        self._spots = {}
+        self._names = {}
+        rank = 0
+
+        for lot in lots:
+            zonas = []
+            for zona in lot['zones']:
+                prefixo = zona.get('prefix', zona['id'])
+                primeiro = int(zona['first_spot'])
+                comuns = frozenset(zona.get('attributes', ()))
+                por_vaga = zona.get('spot_attributes', {})
+                for i in range(int(zona['count'])):
+                    spot = primeiro + i
+                    nome = f"{prefixo}{i + 1}"
+                    if spot in self._spots:
+                        raise ValueError(f"Vaga {spot} aparece em mais de uma zona")
+                    if nome in self._names:
+                        raise ValueError(f"Nome de vaga repetido no layout: {nome}")
+                    self._spots[spot] = SpotInfo(
+                        spot, nome, lot['id'], zona['id'], zona.get('level', 0), rank,
+                        comuns | frozenset(por_vaga.get(nome, ())))
+                    self._names[nome] = spot
+                    rank += 1
+                zonas.append({'id': zona['id'], 'level': zona.get('level', 0),
+                              'first_spot': primeiro, 'count': int(zona['count'])})
+            self.lots.append({'id': lot['id'], 'name': lot.get('name', lot['id']),
+                              'zones': zonas})
+
+    @classmethod
+    def from_config(cls, config, total_spots):
+        layout = config.get('layout')
+        if layout is None:
+            # Nomes iguais aos do prefixo MQTT ('A12'), que passam a vir do layout
+            prefixo = config.get('mqtt', {}).get('spot_prefix', DEFAULT_ZONE)
+            layout = {'lots': [{'id': DEFAULT_LOT, 'zones': [
+                {'id': DEFAULT_ZONE, 'first_spot': 1, 'count': total_spots,
+                 'prefix': prefixo}]}]}
+        return cls(layout['lots'])
+
+    def __len__(self):
+        return len(self._spots)
+
+    def __iter__(self):
+        return iter(self._spots.values())
+
+    def get(self, spot):
+        return self._spots.get(spot)
+
+    def names(self):
+        """{nome: número} para resolver 'A12' nos tópicos e na API"""
+        return dict(self._names)
+
+    def name_of(self, spot):
+        info = self._spots.get(spot)
+        return info.name if info is not None else f"{DEFAULT_ZONE}{spot}"
+
+    def zone_of(self, spot):
+        info = self._spots.get(spot)
+        return info.zone if info is not None else DEFAULT_ZONE
+
+    def level_of(self, spot):
+        info = self._spots.get(spot)
+        return info.level if info is not None else 0
+
+    def rows(self):
+        """Linhas (spot, nome, lot, zone, level, attributes) para a tabela spots"""
+        return [(s.spot, s.name, s.lot, s.zone, s.level, json.dumps(sorted(s.attributes)))
+                for s in self._spots.values()]
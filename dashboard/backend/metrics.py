@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+# ===============================
+# MÉTRICAS (FORMATO PROMETHEUS) E LOGS AMOSTRADOS
+# ===============================
+
+# Buckets padrão de latência, em segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 'print': mensagens no console como antes; 'sampled': JSON via logging
+# para uma fração dos eventos; 'quiet': nada (só as métricas)
+LOG_MODE = os.environ.get('LOG_MODE', 'print')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+_logger = logging.getLogger('smart_parking')
+
+
+def _labels_text(names, values):
+    if not names:
+        return ''
+    pares = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pares + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        linhas = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            itens = list(self._values.items())
+        for valores, total in itens:
+            linhas.append(f'{self.name}{_labels_text(self.labels, valores)} {total}')
+        return linhas
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {labels: [contagens por bucket..., soma, total]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(label_values)
+            if serie is None:
+                serie = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                serie[idx] += 1
+            serie[-2] += value
+            serie[-1] += 1
+
+    def time(self, *label_values):
+        """Context manager que observa a duração do bloco"""
+        return _Timer(self, label_values)
+
+    def render(self):
+        linhas = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            itens = [(k, list(v)) for k, v in self._series.items()]
+        nomes = self.labels + ('le',)
+        for valores, serie in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, serie):
+                acumulado += contagem
+                linhas.append(f'{self.name}_bucket'
+                              f'{_labels_text(nomes, valores + (limite,))} {acumulado}')
+            linhas.append(f'{self.name}_bucket'
+                          f'{_labels_text(nomes, valores + ("+Inf",))} {serie[-1]}')
+            rotulos = _labels_text(self.labels, valores)
+            linhas.append(f'{self.name}_sum{rotulos} {serie[-2]}')
+            linhas.append(f'{self.name}_count{rotulos} {serie[-1]}')
+        return linhas
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'inicio')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.inicio, *self.labels)
+
+
+class GaugeCallback:
+    """Valor lido na hora da coleta (ex.: profundidade de fila).
+
+    Com ``kind='counter'``, para contadores acumulados mantidos por outro
+    objeto (o nome deve terminar em _total).
+    """
+
+    def __init__(self, name, help, fn, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}',
+                f'{self.name} {self.fn()}']
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # Reimportar um módulo devolve a métrica existente
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        linhas = []
+        for metric in self._metrics.values():
+            linhas.extend(metric.render())
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def gauge_callback(name, help, fn):
+    return REGISTRY.register(GaugeCallback(name, help, fn))
+
+
+def counter_callback(name, help, fn):
+    return REGISTRY.register(GaugeCallback(name, help, fn, kind='counter'))
+
+
+LOG_EVENTS = counter('smart_parking_log_events_total',
+                     'Eventos de log emitidos pelo backend', ('event',))
+
+
+def log_event(evento, mensagem, **campos):
+    """Log de evento do caminho quente, conforme LOG_MODE.
+
+    Todo evento é contado em LOG_EVENTS; o custo de I/O de console só
+    é pago em 'print' (todos) ou 'sampled' (fração LOG_SAMPLE_RATE).
+    """
+    LOG_EVENTS.inc(evento)
+    if LOG_MODE == 'print':
+        print(mensagem)
+    elif LOG_MODE == 'sampled' and random.random() < LOG_SAMPLE_RATE:
+        campos.update(event=evento, ts=time.time(), msg=mensagem)
+        _logger.info(json.dumps(campos, default=str, ensure_ascii=False))
@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+
+from metrics import log_event
+
+# ===============================
+# PIPELINE DE INGESTÃO MQTT
+# ===============================
+
+
+class IngestPipeline:
+    """Fila limitada entre o callback MQTT e uma única thread escritora.
+
+    O callback do paho só chama ``submit`` (O(1), nunca bloqueia). A
+    thread escritora junta as mensagens que chegam dentro de uma janela
+    curta, decodifica com ``parse(topic, payload)``, coalesce as leituras
+    por vaga (a mais recente vence, campo a campo) e entrega o lote para
+    ``apply_batch(leituras)``, que grava tudo em uma transação.
+    ``tick()``, se definido, roda a cada volta (no máximo ~0,5 s) e pode
+    devolver leituras geradas pelo tempo, aplicadas do mesmo jeito.
+    ``admit(leitura, lote)``, se definido, descarta leituras (atrasadas,
+    duplicadas) antes da coalescência; ``lote`` é um dict novo a cada lote,
+    entregue a ``commit(lote)`` só depois que ``apply_batch`` gravou o lote.
+    """
+
+    def __init__(self, parse, apply_batch, maxsize=10000, window=0.05,
+                 max_batch=5000, tick=None, admit=None, commit=None):
+        self._parse = parse
+        self._apply_batch = apply_batch
+        self._tick = tick
+        self._admit = admit
+        self._commit = commit
+        self._queue = queue.Queue(maxsize)
+        self._window = window
+        self._max_batch = max_batch
+        self._thread = None
+        self._running = False
+
+        self.received = 0
+        self.dropped = 0
+        self.parse_errors = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.apply_errors = 0
+        self.rejected = 0
+
+    def submit(self, topic, payload):
+        """Enfileira uma mensagem; descarta (e conta) se a fila estiver cheia"""
+        self.received += 1
+        try:
+            self._queue.put_nowait((topic, payload))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='mqtt-ingest', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'received': self.received,
+            'dropped': self.dropped,
+            'parse_errors': self.parse_errors,
+            'processed': self.processed,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'apply_errors': self.apply_errors,
+            'rejected': self.rejected
+        }
+
+    def _collect(self):
+        """Espera a primeira mensagem e junta as que chegarem na janela"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max_batch:
+            restante = deadline - time.monotonic()
+            try:
+                if restante > 0:
+                    batch.append(self._queue.get(timeout=restante))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self.process(batch)
+            if self._tick is not None:
+                self._run_tick()
+
+    def _run_tick(self):
+        try:
+            leituras = self._tick()
+            if leituras:
+                self._apply_batch(leituras)
+        except Exception as e:
+            self.apply_errors += 1
+            print(f"❌ Erro ao aplicar leituras agendadas: {e}")
+
+    def process(self, batch):
+        """Decodifica, coalesce e aplica um lote de (topic, payload)"""
+        leituras = {}
+        lote = {}
+        total = 0
+        for topic, payload in batch:
+            try:
+                parsed = self._parse(topic, payload)
+            except Exception as e:
+                self.parse_errors += 1
+                log_event('mqtt_parse_error',
+                          f"❌ Erro ao decodificar mensagem de {topic}: {e}",
+                          topic=topic, error=str(e))
+                continue
+
+            for leitura in parsed:
+                if self._admit is not None and not self._admit(leitura, lote):
+                    self.rejected += 1
+                    continue
+                total += 1
+                atual = leituras.get(leitura['spot'])
+                if atual is None:
+                    leituras[leitura['spot']] = dict(leitura)
+                else:
+                    atual.update(
+                        (k, v) for k, v in leitura.items() if v is not None)
+
+        if not leituras:
+            return
+
+        try:
+            self._apply_batch(list(leituras.values()))
+        except Exception as e:
+            self.apply_errors += 1
+            print(f"❌ Erro ao aplicar lote MQTT: {e}")
+            return
+
+        if self._commit is not None:
+            self._commit(lote)
+
+        self.batches += 1
+        self.processed += total
+        self.coalesced += total - len(leituras)
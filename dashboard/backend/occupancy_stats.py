@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import deque
+
+# ===============================
+# AGREGADOS DE OCUPAÇÃO (O(1))
+# ===============================
+
+# Janelas móveis em segundos
+WINDOWS = {'5m': 300, '1h': 3600, '24h': 86400}
+
+
+class OccupancyStats:
+    """Contadores de ocupação mantidos incrementalmente a cada transição.
+
+    Totais gerais, por zona e por nível são atualizados em O(1) pelo
+    listener do SpotStore. A taxa de ocupação em janela móvel é a integral
+    no tempo de vagas ocupadas / vagas existentes, guardada em buffers
+    circulares de ``resolution`` segundos com somas corridas por janela,
+    então a consulta não depende do número de vagas nem do tamanho da
+    janela.
+    """
+
+    def __init__(self, zone_of, level_of=None, resolution=60, windows=WINDOWS, clock=time.time):
+        self._zone_of = zone_of
+        self._level_of = level_of or (lambda spot: 0)
+        self._resolution = resolution
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # Janelas em número de buckets; o ring cobre a maior delas
+        self._windows = {nome: max(1, segundos // resolution)
+                         for nome, segundos in windows.items()}
+        self._size = max(self._windows.values())
+        self._ring_occ = [0.0] * self._size
+        self._ring_cap = [0.0] * self._size
+        self._sum_occ = dict.fromkeys(self._windows, 0.0)
+        self._sum_cap = dict.fromkeys(self._windows, 0.0)
+
+        # Permanência (segundos) das saídas nas últimas 24 h
+        self._dwell_window = windows.get('24h', 86400)
+        self._dwells = deque()
+        self._dwell_sum = 0.0
+
+        self._reset_counters()
+        self._bucket = int(self._clock() // resolution)
+        self._partial_occ = 0.0
+        self._partial_cap = 0.0
+        self._last_t = self._clock()
+
+    def _reset_counters(self):
+        self.version = getattr(self, 'version', 0) + 1  # muda junto com os contadores
+        self.total = 0
+        self.occupied = 0
+        self.zones = {}   # {zona: [total, ocupadas]}
+        self.levels = {}  # {nível: [total, ocupadas]}
+
+    # -------- Contadores --------
+
+    def load(self, spots):
+        """Recalcula os contadores a partir de um snapshot completo"""
+        with self._lock:
+            self._advance(self._clock())
+            self._reset_counters()
+            for spot in spots:
+                self._count(spot, +1)
+
+    def _count(self, spot, sinal):
+        zona = self.zones.setdefault(self._zone_of(spot['spot']), [0, 0])
+        nivel = self.levels.setdefault(self._level_of(spot['spot']), [0, 0])
+        zona[0] += sinal
+        nivel[0] += sinal
+        self.total += sinal
+        if spot['occupied']:
+            zona[1] += sinal
+            nivel[1] += sinal
+            self.occupied += sinal
+
+    def on_change(self, anterior, atual):
+        """Listener do SpotStore"""
+        if anterior is not None and anterior['occupied'] == atual['occupied']:
+            return
+        with self._lock:
+            self._advance(self._clock())
+            if anterior is not None:
+                self._count(anterior, -1)
+            self._count(atual, +1)
+            self.version += 1
+
+    def record_dwell(self, seconds):
+        """Registra a permanência de um veículo que saiu"""
+        with self._lock:
+            agora = self._clock()
+            self._dwells.append((agora, seconds))
+            self._dwell_sum += seconds
+            self._expire_dwells(agora)
+
+    def _expire_dwells(self, agora):
+        limite = agora - self._dwell_window
+        while self._dwells and self._dwells[0][0] < limite:
+            self._dwell_sum -= self._dwells.popleft()[1]
+
+    # -------- Janelas móveis --------
+
+    def _advance(self, agora):
+        """Acumula a integral até agora, fechando os buckets que passaram"""
+        bucket = int(agora // self._resolution)
+        t = self._last_t
+        if bucket - self._bucket > self._size:
+            # Parado por mais que o ring inteiro: todos os buckets são iguais
+            occ = self.occupied * self._resolution
+            cap = self.total * self._resolution
+            self._ring_occ = [occ] * self._size
+            self._ring_cap = [cap] * self._size
+            for nome, n in self._windows.items():
+                self._sum_occ[nome] = occ * n
+                self._sum_cap[nome] = cap * n
+            self._bucket = bucket
+            self._partial_occ = self._partial_cap = 0.0
+            t = bucket * self._resolution
+
+        while self._bucket < bucket:
+            fim = (self._bucket + 1) * self._resolution
+            dt = max(0.0, fim - t)
+            self._close_bucket(self._partial_occ + self.occupied * dt,
+                               self._partial_cap + self.total * dt)
+            self._partial_occ = self._partial_cap = 0.0
+            t = fim
+
+        dt = max(0.0, agora - t)
+        self._partial_occ += self.occupied * dt
+        self._partial_cap += self.total * dt
+        self._last_t = agora
+
+    def _close_bucket(self, occ, cap):
+        idx = self._bucket % self._size
+        for nome, n in self._windows.items():
+            saindo = (self._bucket - n) % self._size
+            self._sum_occ[nome] += occ - self._ring_occ[saindo]
+            self._sum_cap[nome] += cap - self._ring_cap[saindo]
+        self._ring_occ[idx] = occ
+        self._ring_cap[idx] = cap
+        self._bucket += 1
+
+    # -------- Consultas --------
+
+    def counters(self):
+        with self._lock:
+            return {
+                'total_spots': self.total,
+                'occupied_spots': self.occupied,
+                'free_spots': self.total - self.occupied,
+                'zones': {
+                    zona: {'total': t, 'occupied': o, 'free': t - o}
+                    for zona, (t, o) in self.zones.items()
+                },
+                'levels': {
+                    nivel: {'total': t, 'occupied': o, 'free': t - o}
+                    for nivel, (t, o) in sorted(self.levels.items())
+                }
+            }
+
+    def rolling(self):
+        with self._lock:
+            agora = self._clock()
+            self._advance(agora)
+            self._expire_dwells(agora)
+
+            taxas = {}
+            for nome in self._windows:
+                cap = self._sum_cap[nome] + self._partial_cap
+                occ = self._sum_occ[nome] + self._partial_occ
+                taxas[nome] = round(occ / cap * 100, 1) if cap > 0 else 0
+
+            media = self._dwell_sum / len(self._dwells) if self._dwells else None
+            return {
+                'occupancy_rate': taxas,
+                'mean_dwell_seconds': round(media, 1) if media is not None else None,
+                'departures_24h': len(self._dwells)
+            }
@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime
+
+# ===============================
+# LEITURAS ATRASADAS E DUPLICADAS
+# ===============================
+
+# Sequência que volta atrás com timestamp pelo menos N segundos mais novo
+# é tratada como reinício do ESP32 (o contador recomeça do zero). Se algum
+# dos dois timestamps é o horário de chegada (sensor sem NTP), só vale se a
+# sequência recomeçou de fato (até SEQ_RESET_MAX): uma retransmissão
+# atrasada também chega com horário de chegada mais novo.
+SEQ_RESET_GRACE = 5.0
+SEQ_RESET_MAX = 3
+
+
+class _SpotMark:
+    """Última leitura aceita de uma vaga"""
+    __slots__ = ('ts', 'chegada', 'seq', 'occupied', 'distancia')
+
+    def __init__(self):
+        self.ts = None
+        self.chegada = False  # ts é o horário de chegada, não do sensor
+        self.seq = None
+        self.occupied = None
+        self.distancia = None
+
+    def copy(self):
+        mark = _SpotMark()
+        mark.ts, mark.chegada, mark.seq = self.ts, self.chegada, self.seq
+        mark.occupied, mark.distancia = self.occupied, self.distancia
+        return mark
+
+
+class ReadingGuard:
+    """Descarta leituras antigas ou repetidas antes de qualquer acesso ao banco.
+
+    Guarda, por vaga, o timestamp e a sequência (campo ``seq`` do payload,
+    quando o firmware envia) da última leitura aceita. Com sequência:
+    menor é atrasada, igual é duplicada. Só com timestamp: mais antigo é
+    atrasado, e o mesmo timestamp com os mesmos valores é duplicado
+    (retransmissão QoS, dois gateways). Leituras sem timestamp nem
+    sequência passam sempre. Cada verificação é O(1).
+
+    Com ``lote`` (um dict por lote), as leituras aceitas só marcam o
+    próprio lote; ``confirm(lote)`` leva as marcas ao guard depois que o
+    lote foi gravado. Um lote desfeito não transforma a retransmissão do
+    sensor em duplicada.
+    """
+
+    def __init__(self, seq_reset_grace=SEQ_RESET_GRACE):
+        self.seq_reset_grace = seq_reset_grace
+        self._lock = threading.Lock()
+        self._spots = {}
+
+        self.accepted = 0
+        self.stale = 0
+        self.duplicates = 0
+        self.resets = 0
+
+    def check(self, leitura, lote=None):
+        """None se a leitura foi aceita (e registrada); senão 'stale' ou 'duplicate'"""
+        ts = leitura.get('timestamp')
+        seq = leitura.get('seq')
+        if ts is None and seq is None:
+            self.accepted += 1
+            return None
+        if ts is not None:
+            ts = datetime.fromisoformat(ts).timestamp()
+
+        spot = leitura['spot']
+        with self._lock:
+            mark = lote.get(spot) if lote is not None else None
+            if mark is None:
+                mark = self._spots.get(spot)
+            if mark is None:
+                mark = self._spots[spot] = _SpotMark()
+
+            motivo = self._motivo(mark, ts, seq, leitura)
+            if motivo is not None:
+                if motivo == 'stale':
+                    self.stale += 1
+                else:
+                    self.duplicates += 1
+                return motivo
+
+            if lote is not None and lote.get(spot) is not mark:
+                mark = lote[spot] = mark.copy()
+
+            if ts is not None:
+                mark.ts = ts
+                mark.chegada = bool(leitura.get('timestamp_chegada'))
+            if seq is not None:
+                mark.seq = seq
+            mark.occupied = leitura.get('occupied')
+            mark.distancia = leitura.get('distancia')
+            self.accepted += 1
+            return None
+
+    def admit(self, leitura, lote=None):
+        return self.check(leitura, lote) is None
+
+    def confirm(self, lote):
+        """Marcas de um lote já gravado passam a valer para as próximas leituras"""
+        with self._lock:
+            self._spots.update(lote)
+
+    def _motivo(self, mark, ts, seq, leitura):
+        if seq is not None and mark.seq is not None:
+            if seq > mark.seq:
+                return None
+            if (ts is not None and mark.ts is not None
+                    and ts - mark.ts >= self.seq_reset_grace
+                    and (seq <= SEQ_RESET_MAX or not (
+                        mark.chegada or leitura.get('timestamp_chegada')))):
+                self.resets += 1
+                return None
+            return 'duplicate' if seq == mark.seq else 'stale'
+
+        if ts is None or mark.ts is None or ts > mark.ts:
+            return None
+        if ts < mark.ts:
+            return 'stale'
+        if (leitura.get('occupied') == mark.occupied and
+                leitura.get('distancia') == mark.distancia):
+            return 'duplicate'
+        return None
+
+    def stats(self):
+        return {
+            'spots': len(self._spots),
+            'accepted': self.accepted,
+            'stale': self.stale,
+            'duplicates': self.duplicates,
+            'seq_resets': self.resets
+        }
@@ -0,0 +1,99 @@
+import gzip
+import json
+import threading
+
+# Encoder rápido opcional: pip install orjson
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# ===============================
+# CACHE DE RESPOSTAS PRÉ-SERIALIZADAS
+# ===============================
+
+GZIP_MIN_SIZE = 1024   # corpos menores não compensam o gzip
+GZIP_LEVEL = 6
+
+
+def dumps(data):
+    """JSON em bytes, com chaves ordenadas como o jsonify do Flask"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+class ResponseCache:
+    """Corpos JSON já codificados, por chave, válidos para uma versão do estado.
+
+    ``version()`` é lida antes de montar o corpo, então uma entrada nunca
+    é mais antiga que a versão com que foi guardada. As escritas invalidam
+    o cache ao avançar a versão. Se a entrada estiver velha, só um leitor
+    por chave reconstrói; os demais esperam no lock da chave e reaproveitam
+    o resultado.
+    """
+
+    def __init__(self, version, gzip_min_size=GZIP_MIN_SIZE):
+        self._version = version
+        self.gzip_min_size = gzip_min_size
+        self._entries = {}   # {chave: (versão, corpo, corpo_gzip | None)}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+        self.hits = 0
+        self.rebuilds = 0
+        self.shared = 0
+
+    def _lock_for(self, chave):
+        lock = self._locks.get(chave)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(chave, threading.Lock())
+        return lock
+
+    def get(self, chave, montar, version=None):
+        """(versão, corpo, corpo_gzip) da versão atual; ``montar()`` só se preciso.
+
+        ``version`` substitui a função de versão padrão para esta chave.
+        """
+        version = version or self._version
+        entrada = self._entries.get(chave)
+        if entrada is not None and entrada[0] == version():
+            self.hits += 1
+            return entrada
+
+        with self._lock_for(chave):
+            versao = version()
+            entrada = self._entries.get(chave)
+            if entrada is not None and entrada[0] == versao:
+                # Outro leitor reconstruiu enquanto este esperava
+                self.shared += 1
+                return entrada
+
+            corpo = dumps(montar())
+            corpo_gzip = None
+            if len(corpo) >= self.gzip_min_size:
+                corpo_gzip = gzip.compress(corpo, GZIP_LEVEL)
+            entrada = (versao, corpo, corpo_gzip)
+            self._entries[chave] = entrada
+            self.rebuilds += 1
+            return entrada
+
+    def invalidate(self, chave=None):
+        """Descarta uma entrada (ou todas) sem esperar a versão mudar"""
+        if chave is None:
+            self._entries = {}
+        else:
+            self._entries.pop(chave, None)
+
+    def stats(self):
+        return {
+            'entries': {chave: {'version': e[0], 'bytes': len(e[1]),
+                                'gzip_bytes': len(e[2]) if e[2] else None}
+                        for chave, e in list(self._entries.items())},
+            'hits': self.hits,
+            'rebuilds': self.rebuilds,
+            'shared_rebuilds': self.shared,
+            'orjson': ORJSON_AVAILABLE
+        }
@@ -0,0 +1,381 @@
+import csv
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import history
+
+# Exportação opcional em Parquet: pip install pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# ===============================
+# RETENÇÃO E ARQUIVAMENTO
+# ===============================
+
+DEFAULT_RETENTION = {
+    'raw_days': 7,              # amostras de distância brutas
+    'transition_days': 365,     # transições (cobrança/receita); None = nunca apaga
+    'hourly_days': 90,          # agregados por hora antes de virarem diários
+    'batch_size': 2000,         # linhas por transação
+    'pause': 0.05,              # segundos entre lotes (a ingestão pega o lock)
+    'vacuum_pages': 500,        # páginas devolvidas por passo do incremental_vacuum
+    'interval': 3600,           # segundos entre execuções em background
+    'archive_dir': None,        # exporta as linhas brutas antes de apagar
+    'archive_format': 'csv.gz'  # 'csv.gz' ou 'parquet'
+}
+
+ARCHIVE_COLUMNS = ('id', 'spot', 'ts', 'kind', 'occupied', 'distancia')
+
+# Linhas de um lote: as mais antigas até (ts, id) da fronteira, na ordem do
+# índice; ``max_id`` deixa de fora linhas inseridas depois da leitura do lote
+# (leituras de gateway podem chegar com ts antigo)
+_LOTE = '''
+    ts < :cutoff AND kind = :kind AND (ts, id) <= (:fim_ts, :fim_id) AND id <= :max_id
+    {manter}
+'''
+
+SQL_ROLLUP_HORA = '''
+    INSERT INTO spot_events_hourly
+        (spot, ts, samples, occupied_sum, distancia_sum, distancia_count, entries)
+    SELECT spot, (ts + :off) - ((ts + :off) % 3600) - :off,
+           COUNT(*), COALESCE(SUM(occupied), 0), COALESCE(SUM(distancia), 0),
+           COUNT(distancia), SUM(kind = {transicao} AND occupied = 1)
+    FROM spot_events
+    WHERE {lote}
+    GROUP BY 1, 2
+    ON CONFLICT (spot, ts) DO UPDATE SET
+        samples = samples + excluded.samples,
+        occupied_sum = occupied_sum + excluded.occupied_sum,
+        distancia_sum = distancia_sum + excluded.distancia_sum,
+        distancia_count = distancia_count + excluded.distancia_count,
+        entries = entries + excluded.entries
+'''
+
+SQL_ROLLUP_DIA = '''
+    INSERT INTO spot_events_daily
+        (spot, ts, samples, occupied_sum, distancia_sum, distancia_count, entries)
+    SELECT spot, (ts + :off) - ((ts + :off) % 86400) - :off,
+           SUM(samples), SUM(occupied_sum), SUM(distancia_sum),
+           SUM(distancia_count), SUM(entries)
+    FROM spot_events_hourly
+    WHERE ts < :cutoff AND (ts, spot) <= (:fim_ts, :fim_spot)
+    GROUP BY 1, 2
+    ON CONFLICT (spot, ts) DO UPDATE SET
+        samples = samples + excluded.samples,
+        occupied_sum = occupied_sum + excluded.occupied_sum,
+        distancia_sum = distancia_sum + excluded.distancia_sum,
+        distancia_count = distancia_count + excluded.distancia_count,
+        entries = entries + excluded.entries
+'''
+
+
+class RetentionManager:
+    """Compacta o histórico antigo sem travar a ingestão.
+
+    Eventos brutos mais velhos que ``raw_days`` (amostras) ou
+    ``transition_days`` (transições) são somados em ``spot_events_hourly``
+    e apagados no mesmo commit, em lotes de ``batch_size`` linhas com uma
+    pausa entre eles; agregados por hora mais velhos que ``hourly_days``
+    viram diários do mesmo jeito. Com ``archive_dir``, cada lote é
+    exportado (CSV.gz ou Parquet, um arquivo por dia) antes de ser apagado;
+    a exportação lê de um snapshot, fora do lock de escrita, que só é pego
+    para somar e apagar o lote já exportado.
+    No fim, ``PRAGMA incremental_vacuum`` devolve as páginas livres ao
+    sistema em passos curtos.
+    """
+
+    def __init__(self, db, raw_days=7, transition_days=365, hourly_days=90,
+                 batch_size=2000, pause=0.05, vacuum_pages=500, interval=3600,
+                 archive_dir=None, archive_format='csv.gz', clock=time.time):
+        if archive_format not in ('csv.gz', 'parquet'):
+            raise ValueError("archive_format deve ser 'csv.gz' ou 'parquet'")
+        if archive_dir and archive_format == 'parquet' and not PYARROW_AVAILABLE:
+            raise ValueError("archive_format 'parquet' requer pyarrow (pip install pyarrow)")
+        self.db = db
+        self.raw_days = raw_days
+        self.transition_days = transition_days
+        self.hourly_days = hourly_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self._clock = clock
+        self._thread = None
+        self._stop = threading.Event()
+        self._running = threading.Lock()
+
+        self.runs = 0
+        self.rows_rolled = 0
+        self.rows_archived = 0
+        self.hourly_rolled = 0
+        self.pages_freed = 0
+        self.last_run = None
+        self.last_duration = None
+
+    @classmethod
+    def from_config(cls, db, config):
+        return cls(db, **dict(DEFAULT_RETENTION, **config))
+
+    # -------- Execução --------
+
+    def run(self):
+        """Uma passada completa; retorna o resumo da execução"""
+        if not self._running.acquire(blocking=False):
+            return None  # já em andamento (thread ou chamada manual)
+        try:
+            inicio = time.perf_counter()
+            agora = self._clock()
+            resumo = {'samples': 0, 'transitions': 0, 'hourly': 0, 'archived': 0, 'pages_freed': 0}
+
+            if self.raw_days is not None:
+                resumo['samples'] = self._compactar(
+                    history.EVENT_DISTANCIA, agora - self.raw_days * 86400, resumo)
+            if self.transition_days is not None:
+                resumo['transitions'] = self._compactar(
+                    history.EVENT_TRANSICAO, agora - self.transition_days * 86400, resumo)
+            if self.hourly_days is not None:
+                resumo['hourly'] = self._diarios(agora - self.hourly_days * 86400)
+            resumo['pages_freed'] = self._vacuum()
+
+            self.runs += 1
+            self.last_run = datetime.fromtimestamp(agora).isoformat()
+            self.last_duration = round(time.perf_counter() - inicio, 3)
+            return resumo
+        finally:
+            self._running.release()
+
+    def _compactar(self, kind, cutoff, resumo):
+        """Soma nos agregados por hora e apaga, lote a lote, os eventos < cutoff"""
+        manter = ''
+        if kind == history.EVENT_TRANSICAO:
+            # A última transição de cada vaga fica (horário de entrada das
+            # vagas ocupadas); só importam as que já passaram do corte
+            with self.db.connection() as conn:
+                ultimas = [event_id for event_id, ts in conn.execute(
+                    'SELECT MAX(id), ts FROM spot_events WHERE kind = ? GROUP BY spot',
+                    (kind,)) if ts < cutoff]
+            if ultimas:
+                manter = f"AND id NOT IN ({', '.join(map(str, ultimas))})"
+        lote = _LOTE.format(manter=manter)
+        total = 0
+
+        while not self._stop.is_set():
+            params = {'cutoff': int(cutoff), 'kind': kind}
+            linhas = None
+            with self.db.connection() as conn:
+                # Snapshot de leitura (WAL): não segura o lock de escrita
+                conn.execute('BEGIN')
+                try:
+                    # Fronteira do lote: a batch_size-ésima linha mais antiga (ou a última)
+                    fronteira = conn.execute(f'''
+                        SELECT ts, id FROM (
+                            SELECT ts, id FROM spot_events
+                            WHERE ts < :cutoff AND kind = :kind {manter}
+                            ORDER BY ts, id LIMIT :n
+                        ) ORDER BY ts DESC, id DESC LIMIT 1
+                    ''', dict(params, n=self.batch_size)).fetchone()
+                    if fronteira is not None:
+                        ultimo_id = conn.execute('SELECT MAX(id) FROM spot_events').fetchone()[0]
+                        params.update(fim_ts=fronteira[0], fim_id=fronteira[1],
+                                      max_id=ultimo_id, off=history.utc_offset())
+                        if self.archive_dir:
+                            linhas = conn.execute(
+                                f'SELECT {", ".join(ARCHIVE_COLUMNS)} FROM spot_events '
+                                f'WHERE {lote}', params).fetchall()
+                finally:
+                    conn.execute('COMMIT')
+            if fronteira is None:
+                break
+
+            # Disco (gzip/parquet) fora da transação; o lock de escrita é só
+            # para o rollup e o DELETE das linhas exportadas
+            if linhas is not None:
+                resumo['archived'] += self._arquivar(linhas)
+
+            with self.db.transaction() as conn:
+                conn.execute(SQL_ROLLUP_HORA.format(
+                    transicao=history.EVENT_TRANSICAO, lote=lote), params)
+                apagadas = conn.execute(
+                    f'DELETE FROM spot_events WHERE {lote}', params).rowcount
+
+            total += apagadas
+            self.rows_rolled += apagadas
+            if apagadas < self.batch_size:
+                break
+            self._stop.wait(self.pause)
+        return total
+
+    def _diarios(self, cutoff):
+        """Agregados por hora < cutoff viram diários, em lotes"""
+        total = 0
+        while not self._stop.is_set():
+            with self.db.transaction() as conn:
+                fronteira = conn.execute('''
+                    SELECT ts, spot FROM (
+                        SELECT ts, spot FROM spot_events_hourly
+                        WHERE ts < :cutoff ORDER BY ts, spot LIMIT :n
+                    ) ORDER BY ts DESC, spot DESC LIMIT 1
+                ''', {'cutoff': int(cutoff), 'n': self.batch_size}).fetchone()
+                if fronteira is None:
+                    break
+                params = {'cutoff': int(cutoff), 'fim_ts': fronteira[0],
+                          'fim_spot': fronteira[1], 'off': history.utc_offset()}
+                conn.execute(SQL_ROLLUP_DIA, params)
+                apagadas = conn.execute('''
+                    DELETE FROM spot_events_hourly
+                    WHERE ts < :cutoff AND (ts, spot) <= (:fim_ts, :fim_spot)
+                ''', params).rowcount
+
+            total += apagadas
+            self.hourly_rolled += apagadas
+            if apagadas < self.batch_size:
+                break
+            self._stop.wait(self.pause)
+        return total
+
+    def _vacuum(self):
+        """Devolve as páginas livres em passos de vacuum_pages (só em auto_vacuum=INCREMENTAL)"""
+        with self.db.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
+
+        liberadas = 0
+        while not self._stop.is_set():
+            with self.db.transaction() as conn:
+                livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if livres == 0:
+                    break
+                conn.execute(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})').fetchall()
+                passo = livres - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            liberadas += passo
+            self.pages_freed += passo
+            if passo <= 0:
+                break
+            self._stop.wait(self.pause)
+        return liberadas
+
+    # -------- Arquivamento --------
+
+    def _arquivar(self, linhas):
+        """Exporta as linhas do lote, um arquivo (ou parte) por dia local de ts"""
+        if not linhas:
+            return 0
+        os.makedirs(self.archive_dir, exist_ok=True)
+        por_dia = {}
+        for linha in linhas:
+            dia = datetime.fromtimestamp(linha[2]).date().isoformat()
+            por_dia.setdefault(dia, []).append(linha)
+
+        for dia, grupo in por_dia.items():
+            if self.archive_format == 'parquet':
+                # Parquet não aceita append: uma parte por lote dentro da pasta do dia
+                pasta = os.path.join(self.archive_dir, f'spot_events-{dia}')
+                os.makedirs(pasta, exist_ok=True)
+                colunas = list(zip(*grupo))
+                tabela = pa.table({nome: list(valores)
+                                   for nome, valores in zip(ARCHIVE_COLUMNS, colunas)})
+                pq.write_table(tabela, os.path.join(pasta, f'part-{grupo[0][0]}.parquet'),
+                               compression='zstd')
+            else:
+                # Membros gzip concatenados formam um arquivo gzip válido
+                caminho = os.path.join(self.archive_dir, f'spot_events-{dia}.csv.gz')
+                novo = not os.path.exists(caminho)
+                with gzip.open(caminho, 'at', newline='', encoding='utf-8') as f:
+                    escritor = csv.writer(f)
+                    if novo:
+                        escritor.writerow(ARCHIVE_COLUMNS)
+                    escritor.writerows(grupo)
+
+        self.rows_archived += len(linhas)
+        return len(linhas)
+
+    # -------- Background --------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                resumo = self.run()
+                if resumo and any(resumo.values()):
+                    print(f"🗄️ Retenção: {resumo}")
+            except Exception as e:
+                print(f"❌ Erro na retenção do histórico: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self):
+        with self.db.connection() as conn:
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            paginas = conn.execute('PRAGMA page_count').fetchone()[0]
+            livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            tamanho = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'config': {
+                'raw_days': self.raw_days,
+                'transition_days': self.transition_days,
+                'hourly_days': self.hourly_days,
+                'batch_size': self.batch_size,
+                'interval': self.interval,
+                'archive_dir': self.archive_dir,
+                'archive_format': self.archive_format if self.archive_dir else None
+            },
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum),
+            'db_bytes': paginas * tamanho,
+            'free_bytes': livres * tamanho,
+            'runs': self.runs,
+            'last_run': self.last_run,
+            'last_duration_s': self.last_duration,
+            'rows_rolled_up': self.rows_rolled,
+            'hourly_rolled_up': self.hourly_rolled,
+            'rows_archived': self.rows_archived,
+            'pages_freed': self.pages_freed
+        }
+
+
+def enable_incremental_vacuum(path):
+    """Converte um banco existente para auto_vacuum=INCREMENTAL (VACUUM completo, uma vez)"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Retenção do histórico do parking.db')
+    parser.add_argument('db', nargs='?', default='parking.db')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='VACUUM único para bancos criados antes do auto_vacuum incremental '
+                             '(pare o backend antes)')
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        ok = enable_incremental_vacuum(args.db)
+        print("✅ auto_vacuum=INCREMENTAL" if ok else "❌ Não foi possível converter o banco")
@@ -0,0 +1,145 @@
+import threading
+import time
+from array import array
+
+# ===============================
+# FILTRO DE LEITURAS DOS SENSORES
+# ===============================
+
+
+class _SpotFilter:
+    """Estado compacto de uma vaga: buffer circular fixo + contadores"""
+    __slots__ = ('buffer', 'idx', 'count', 'ema', 'pending', 'pending_since',
+                 'readings', 'transitions', 'held', 'suppressed')
+
+    def __init__(self, window):
+        self.buffer = array('f', bytes(4 * window))
+        self.idx = 0
+        self.count = 0
+        self.ema = None
+        self.pending = None        # estado candidato aguardando o dwell
+        self.pending_since = 0.0
+        self.readings = 0
+        self.transitions = 0
+        self.held = 0              # leituras seguradas pelo dwell
+        self.suppressed = 0        # candidatos descartados (flaps)
+
+
+class SensorFilter:
+    """Debounce/histerese por vaga antes de qualquer transição.
+
+    Distâncias passam por suavização (mediana ou EMA sobre uma janela
+    fixa) e por uma banda de histerese: abaixo de ``occupy_below`` propõe
+    ocupada, acima de ``free_above`` propõe livre, entre os dois mantém.
+    Todo estado proposto (inclusive a 'situacao' explícita do ESP32) só
+    vira transição depois de persistir por ``min_dwell`` segundos;
+    candidatos que somem antes disso contam como suprimidos.
+    """
+
+    def __init__(self, occupy_below, free_above, window=5, smoothing='median',
+                 ema_alpha=0.3, min_dwell=2.0, clock=time.monotonic):
+        if occupy_below > free_above:
+            raise ValueError('occupy_below deve ser <= free_above')
+        if smoothing not in ('median', 'ema', 'none'):
+            raise ValueError("smoothing deve ser 'median', 'ema' ou 'none'")
+        self.occupy_below = occupy_below
+        self.free_above = free_above
+        self.window = window
+        self.smoothing = smoothing
+        self.ema_alpha = ema_alpha
+        self.min_dwell = min_dwell
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._spots = {}
+        self._pending = set()
+
+    def _get(self, spot):
+        st = self._spots.get(spot)
+        if st is None:
+            st = self._spots[spot] = _SpotFilter(self.window)
+        return st
+
+    def _smooth(self, st, distancia):
+        st.buffer[st.idx] = distancia
+        st.idx = (st.idx + 1) % self.window
+        st.count = min(st.count + 1, self.window)
+
+        if self.smoothing == 'median':
+            valores = sorted(st.buffer[:st.count] if st.count < self.window else st.buffer)
+            return valores[len(valores) // 2]
+        if self.smoothing == 'ema':
+            st.ema = distancia if st.ema is None else (
+                self.ema_alpha * distancia + (1 - self.ema_alpha) * st.ema)
+            return st.ema
+        return distancia
+
+    def update(self, spot, current, occupied=None, distancia=None):
+        """Retorna o estado a aplicar para a vaga (``current`` se segurado)"""
+        with self._lock:
+            st = self._get(spot)
+            st.readings += 1
+
+            proposto = occupied
+            if distancia is not None:
+                suavizada = self._smooth(st, distancia)
+                if proposto is None:
+                    if suavizada < self.occupy_below:
+                        proposto = True
+                    elif suavizada > self.free_above:
+                        proposto = False
+            if proposto is None:
+                proposto = current
+
+            return self._debounce(spot, st, bool(proposto), current)
+
+    def _debounce(self, spot, st, proposto, current):
+        agora = self._clock()
+        if proposto == current:
+            if st.pending is not None:
+                st.suppressed += 1
+                st.pending = None
+                self._pending.discard(spot)
+            return current
+
+        if self.min_dwell <= 0 or (st.pending == proposto and
+                                   agora - st.pending_since >= self.min_dwell):
+            st.pending = None
+            self._pending.discard(spot)
+            st.transitions += 1
+            return proposto
+
+        if st.pending != proposto:
+            st.pending = proposto
+            st.pending_since = agora
+            self._pending.add(spot)
+        st.held += 1
+        return current
+
+    def due(self):
+        """Candidatos que completaram o dwell sem nova leitura: [(spot, estado)]"""
+        if not self._pending:
+            return []
+        agora = self._clock()
+        prontos = []
+        with self._lock:
+            for spot in list(self._pending):
+                st = self._spots[spot]
+                if agora - st.pending_since >= self.min_dwell:
+                    prontos.append((spot, st.pending))
+                    st.pending = None
+                    st.transitions += 1
+                    self._pending.discard(spot)
+        return prontos
+
+    def stats(self):
+        with self._lock:
+            return {
+                spot: {
+                    'readings': st.readings,
+                    'transitions': st.transitions,
+                    'held': st.held,
+                    'suppressed': st.suppressed,
+                    'pending': st.pending
+                }
+                for spot, st in self._spots.items()
+            }
@@ -0,0 +1,229 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from metrics import log_event
+
+# ===============================
+# SAÚDE DOS SENSORES
+# ===============================
+
+STATUS_OK = 'ok'
+STATUS_STALE = 'stale'
+STATUS_OFFLINE = 'offline'
+
+
+def _epoch(timestamp, agora):
+    """Timestamp ISO (horário local) em epoch, limitado a ``agora``"""
+    try:
+        return min(datetime.fromisoformat(timestamp).timestamp(), agora)
+    except ValueError:
+        return agora
+
+
+class _Sensor:
+    """Último contato de um sensor e o estado atual"""
+    __slots__ = ('last_seen', 'status', 'since')
+
+    def __init__(self, last_seen):
+        self.last_seen = last_seen
+        self.status = STATUS_OK
+        self.since = last_seen
+
+
+class SensorHealth:
+    """Detecta sensores que pararam de publicar (stale e depois offline).
+
+    Registrar uma leitura só atualiza ``last_seen`` (O(1)). Cada sensor tem
+    um timer válido num heap de prazos; quando o prazo vence, o timer
+    confere o último contato e é reagendado para o próximo prazo real ou
+    muda o estado do sensor. Sensores ativos custam um timer a cada
+    ``stale_after`` segundos, e a verificação periódica só toca os timers
+    vencidos — nunca varre todos os sensores.
+
+    ``add_listener(callback)`` recebe ``callback(spot, status)`` a cada
+    mudança de estado, inclusive quando um sensor começa a ser monitorado.
+    """
+
+    def __init__(self, stale_after=120, offline_after=600, resolution=1.0, clock=time.time):
+        if offline_after < stale_after:
+            raise ValueError('offline_after deve ser maior ou igual a stale_after')
+        self.stale_after = stale_after
+        self.offline_after = offline_after
+        self.resolution = resolution
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sensores = {}
+        self._timers = []        # heap de (prazo, spot)
+        self._agendados = {}     # {spot: prazo do timer válido}
+        self._contagem = {STATUS_OK: 0, STATUS_STALE: 0, STATUS_OFFLINE: 0}
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.went_stale = 0
+        self.went_offline = 0
+        self.recovered = 0
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notificar(self, mudancas):
+        for spot, status in mudancas:
+            for callback in self._listeners:
+                callback(spot, status)
+
+    def _agendar(self, spot, prazo):
+        # Um timer mais tardio já agendado só é substituído se o novo vence antes
+        # (ex.: sensor que volta de 'stale' com o timer no prazo de 'offline')
+        atual = self._agendados.get(spot)
+        if atual is None or prazo < atual:
+            self._agendados[spot] = prazo
+            heapq.heappush(self._timers, (prazo, spot))
+
+    def _mudar(self, spot, sensor, status, quando, mudancas):
+        self._contagem[sensor.status] -= 1
+        self._contagem[status] += 1
+        sensor.status = status
+        sensor.since = quando
+        mudancas.append((spot, status))
+
+    def _registrar(self, spot, quando, mudancas):
+        sensor = self._sensores.get(spot)
+        if sensor is None:
+            sensor = self._sensores[spot] = _Sensor(quando)
+            self._contagem[STATUS_OK] += 1
+            mudancas.append((spot, STATUS_OK))
+        elif quando > sensor.last_seen:
+            sensor.last_seen = quando
+            if sensor.status != STATUS_OK:
+                self.recovered += 1
+                self._mudar(spot, sensor, STATUS_OK, quando, mudancas)
+        self._agendar(spot, sensor.last_seen + self.stale_after)
+
+    def seen(self, spot, quando=None):
+        """Registra contato do sensor da vaga (epoch; padrão: agora)"""
+        if quando is None:
+            quando = self._clock()
+        mudancas = []
+        with self._lock:
+            self._registrar(spot, quando, mudancas)
+        self._notificar(mudancas)
+
+    def load(self, spots, expected=()):
+        """Monitora as vagas com leitura de distância no banco e as ``expected``.
+
+        O último contato vem de ``distance_updated``; vagas esperadas que
+        nunca publicaram contam a partir de agora.
+        """
+        agora = self._clock()
+        mudancas = []
+        with self._lock:
+            for spot in spots:
+                if spot['distance_updated']:
+                    self._registrar(spot['spot'], _epoch(spot['distance_updated'], agora),
+                                    mudancas)
+            for spot in expected:
+                if spot not in self._sensores:
+                    self._registrar(spot, agora, mudancas)
+        self._notificar(mudancas)
+
+    def on_change(self, anterior, atual):
+        """Listener do SpotStore: nova leitura de distância (inclusive de outro processo)"""
+        if atual['distance_updated'] and (
+                anterior is None or anterior['distance_updated'] != atual['distance_updated']):
+            self.seen(atual['spot'], _epoch(atual['distance_updated'], self._clock()))
+
+    def tick(self, agora=None):
+        """Processa os timers vencidos; retorna quantos sensores mudaram de estado"""
+        if agora is None:
+            agora = self._clock()
+        mudancas = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= agora:
+                prazo, spot = heapq.heappop(self._timers)
+                if self._agendados.get(spot) != prazo:
+                    continue  # substituído por um timer anterior
+                del self._agendados[spot]
+                sensor = self._sensores[spot]
+                idade = agora - sensor.last_seen
+
+                if idade < self.stale_after:
+                    self._agendar(spot, sensor.last_seen + self.stale_after)
+                elif idade < self.offline_after:
+                    if sensor.status == STATUS_OK:
+                        self.went_stale += 1
+                        self._mudar(spot, sensor, STATUS_STALE, agora, mudancas)
+                    self._agendar(spot, sensor.last_seen + self.offline_after)
+                elif sensor.status != STATUS_OFFLINE:
+                    # Sem timer até o próximo contato (seen reagenda)
+                    self.went_offline += 1
+                    self._mudar(spot, sensor, STATUS_OFFLINE, agora, mudancas)
+
+        for spot, status in mudancas:
+            if status != STATUS_OK:
+                log_event('sensor_' + status,
+                          f"📡 Sensor da vaga {spot} sem publicar: {status}",
+                          spot=spot, status=status)
+        self._notificar(mudancas)
+        return len(mudancas)
+
+    def count(self, status):
+        return self._contagem[status]
+
+    def status(self, spot):
+        sensor = self._sensores.get(spot)
+        return sensor.status if sensor is not None else None
+
+    def _formatar(self, spot, sensor):
+        return {
+            'spot': spot,
+            'status': sensor.status,
+            'last_seen': datetime.fromtimestamp(sensor.last_seen).isoformat(),
+            'since': datetime.fromtimestamp(sensor.since).isoformat()
+        }
+
+    def report(self, status=None):
+        """Sensores monitorados (opcionalmente só os de um estado), por vaga"""
+        with self._lock:
+            return [self._formatar(spot, sensor)
+                    for spot, sensor in sorted(self._sensores.items())
+                    if status is None or sensor.status == status]
+
+    def stats(self):
+        with self._lock:
+            contagem = self._contagem
+            return {
+                'sensors': len(self._sensores),
+                'ok': contagem[STATUS_OK],
+                'stale': contagem[STATUS_STALE],
+                'offline': contagem[STATUS_OFFLINE],
+                'timers': len(self._timers),
+                'stale_after': self.stale_after,
+                'offline_after': self.offline_after,
+                'went_stale': self.went_stale,
+                'went_offline': self.went_offline,
+                'recovered': self.recovered
+            }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='sensor-health', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.resolution):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"❌ Erro na verificação dos sensores: {e}")
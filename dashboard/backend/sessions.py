@@ -0,0 +1,187 @@
+import threading
+import time
+from datetime import datetime
+
+from metrics import log_event
+
+# ===============================
+# SESSÕES DE CLIENTES
+# ===============================
+
+SESSION_TTL = 24 * 3600          # sessão aberta há mais que isso é considerada abandonada
+SESSION_SWEEP_INTERVAL = 60.0    # segundos entre varreduras de expiração
+
+# Uma sessão aberta por cliente (chave primária) e por vaga (índice único).
+# started é epoch para a varredura de expiração usar o índice.
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS client_sessions (
+        client_id TEXT PRIMARY KEY,
+        vaga TEXT NOT NULL,
+        spot INTEGER NOT NULL,
+        start_time TEXT NOT NULL,
+        started INTEGER NOT NULL,
+        paid INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_client_sessions_spot ON client_sessions (spot)',
+    'CREATE INDEX IF NOT EXISTS idx_client_sessions_started ON client_sessions (started)',
+)
+
+SQL_COLUMNS = 'client_id, vaga, spot, start_time, paid'
+
+
+def create_schema(conn):
+    for sql in SCHEMA:
+        conn.execute(sql)
+
+
+class SessionConflict(Exception):
+    """A vaga já tem uma sessão aberta de outro cliente"""
+
+    def __init__(self, session):
+        super().__init__(f"Vaga {session['vaga']} em uso por {session['client_id']}")
+        self.session = session
+
+
+def _row_to_session(row):
+    if row is None:
+        return None
+    client_id, vaga, spot, start_time, paid = row
+    return {
+        'client_id': client_id,
+        'vaga': vaga,
+        'spot': spot,
+        'start_time': datetime.fromisoformat(start_time),
+        'paid': bool(paid)
+    }
+
+
+class SessionStore:
+    """Sessões de estacionamento persistidas no SQLite.
+
+    O banco é a única fonte de verdade: toda consulta é uma busca pela
+    chave primária (client_id) ou pelo índice único de vaga, então vários
+    processos (workers do gunicorn) enxergam as mesmas sessões e nada se
+    perde num restart. Uma thread em background expira as sessões
+    abertas há mais de ``ttl`` segundos.
+    """
+
+    def __init__(self, db, ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL,
+                 clock=time.time):
+        self.db = db
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.opened = 0
+        self.closed = 0
+        self.expired = 0
+
+    # -------- Consultas --------
+
+    def get(self, client_id):
+        with self.db.connection() as conn:
+            return _row_to_session(conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions WHERE client_id = ?',
+                (client_id,)).fetchone())
+
+    def get_by_spot(self, spot):
+        with self.db.connection() as conn:
+            return _row_to_session(conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions WHERE spot = ?',
+                (spot,)).fetchone())
+
+    def open_sessions(self):
+        """Todas as sessões abertas (usado na recuperação ao iniciar)"""
+        with self.db.connection() as conn:
+            return [_row_to_session(row) for row in conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions ORDER BY started')]
+
+    # -------- Escritas --------
+
+    def open(self, client_id, vaga, spot, start_time=None):
+        """Abre (ou substitui) a sessão do cliente na vaga.
+
+        Levanta SessionConflict se outro cliente já estiver na vaga.
+        """
+        start_time = start_time or datetime.now()
+        with self.db.transaction() as conn:
+            atual = _row_to_session(conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions WHERE spot = ?',
+                (spot,)).fetchone())
+            if atual is not None and atual['client_id'] != client_id:
+                raise SessionConflict(atual)
+            conn.execute(
+                'INSERT OR REPLACE INTO client_sessions '
+                '(client_id, vaga, spot, start_time, started, paid) VALUES (?, ?, ?, ?, ?, 0)',
+                (client_id, vaga, spot, start_time.isoformat(), int(start_time.timestamp())))
+        self.opened += 1
+        return {'client_id': client_id, 'vaga': vaga, 'spot': spot,
+                'start_time': start_time, 'paid': False}
+
+    def close(self, client_id):
+        """Encerra a sessão do cliente; devolve a sessão removida ou None"""
+        with self.db.transaction() as conn:
+            session = _row_to_session(conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions WHERE client_id = ?',
+                (client_id,)).fetchone())
+            if session is not None:
+                conn.execute('DELETE FROM client_sessions WHERE client_id = ?',
+                             (client_id,))
+        if session is not None:
+            session['paid'] = True
+            self.closed += 1
+        return session
+
+    def expire(self):
+        """Remove as sessões abertas há mais de ttl; devolve as removidas"""
+        limite = int(self._clock() - self.ttl)
+        with self.db.transaction() as conn:
+            vencidas = [_row_to_session(row) for row in conn.execute(
+                f'SELECT {SQL_COLUMNS} FROM client_sessions WHERE started < ?',
+                (limite,))]
+            if vencidas:
+                conn.execute('DELETE FROM client_sessions WHERE started < ?', (limite,))
+        for session in vencidas:
+            log_event('sessao_expirada',
+                      f"⌛ Sessão expirada: {session['client_id']} na vaga {session['vaga']}",
+                      client_id=session['client_id'], spot=session['spot'])
+        self.expired += len(vencidas)
+        return vencidas
+
+    # -------- Varredura em background --------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='session-sweep', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"❌ Erro na varredura de sessões: {e}")
+
+    def stats(self):
+        with self.db.connection() as conn:
+            abertas = conn.execute('SELECT COUNT(*) FROM client_sessions').fetchone()[0]
+        return {
+            'open': abertas,
+            'opened': self.opened,
+            'closed': self.closed,
+            'expired': self.expired,
+            'ttl_seconds': self.ttl
+        }
@@ -0,0 +1,183 @@
+import threading
+import uuid
+from bisect import insort
+from collections import OrderedDict
+
+# ===============================
+# ESTADO DAS VAGAS EM MEMÓRIA
+# ===============================
+
+
+def _registro_vazio(spot):
+    return {
+        'spot': spot,
+        'occupied': False,
+        'updated': None,
+        'distancia': None,
+        'distance_updated': None
+    }
+
+
+class SpotStore:
+    """Estado autoritativo das vagas em memória.
+
+    As escritas passam pelo banco (write-through) e depois por ``apply``;
+    as leituras da API são servidas daqui, sem I/O no SQLite.
+    Cada registro é um dict imutável por convenção: ``apply`` sempre cria
+    um novo dict, então snapshots já entregues continuam consistentes.
+
+    ``version`` cresce a cada alteração e cada vaga guarda a versão em que
+    mudou por último, então ``changed_since`` custa O(alterações). Versões
+    só valem dentro do mesmo ``epoch`` (um por processo).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spots = {}      # {spot: registro}
+        self._ordem = []      # números das vagas, ordenados
+        self._snapshot = None
+        self._listeners = []
+        self._changes = OrderedDict()  # {spot: versão}, da mais antiga à mais recente
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+
+    def load(self, rows):
+        """Carrega (ou recarrega) o estado a partir de linhas do banco.
+
+        Campos que não vêm do banco (ex.: 'sensor', da saúde dos sensores)
+        são mantidos na recarga.
+        """
+        with self._lock:
+            antigos, self._spots = self._spots, {}
+            for spot, occupied, updated, distancia, distance_updated in rows:
+                registro = {
+                    'spot': spot,
+                    'occupied': bool(occupied),
+                    'updated': updated,
+                    'distancia': distancia,
+                    'distance_updated': distance_updated
+                }
+                anterior = antigos.get(spot)
+                if anterior is not None:
+                    for campo, valor in anterior.items():
+                        registro.setdefault(campo, valor)
+                self._spots[spot] = registro
+            self._ordem = sorted(self._spots)
+            self._snapshot = None
+            self.version += 1
+            # Recarga completa: todas as vagas contam como alteradas
+            self._changes = OrderedDict((s, self.version) for s in self._ordem)
+
+    def sync(self, rows, since_version=None):
+        """Aplica linhas do banco que diferem da memória (escritas de outro processo).
+
+        Passa por ``apply``, então os listeners (stream, estatísticas)
+        veem as transições como se tivessem acontecido aqui. Com
+        ``since_version``, vagas alteradas na memória depois dessa versão
+        são puladas (a linha lida é mais antiga). Retorna quantas vagas
+        mudaram.
+        """
+        alteradas = 0
+        for spot, occupied, updated, distancia, distance_updated in rows:
+            if since_version is not None and self._changes.get(spot, 0) > since_version:
+                continue
+            campos = {
+                'occupied': bool(occupied),
+                'updated': updated,
+                'distancia': distancia,
+                'distance_updated': distance_updated
+            }
+            atual = self._spots.get(spot)
+            if atual is not None and all(atual[k] == v for k, v in campos.items()):
+                continue
+            self.apply(spot, **campos)
+            alteradas += 1
+        return alteradas
+
+    def add_listener(self, callback):
+        """Registra callback(anterior, atual) chamado a cada alteração"""
+        self._listeners.append(callback)
+
+    def get(self, spot):
+        return self._spots.get(spot)
+
+    def all(self):
+        """Lista ordenada das vagas (somente leitura)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = [self._spots[s] for s in self._ordem]
+                    self._snapshot = snapshot
+        return snapshot
+
+    def changed_since(self, version):
+        """(versão atual, vagas alteradas depois de ``version``, ordenadas)"""
+        with self._lock:
+            alteradas = []
+            for spot, versao in reversed(self._changes.items()):
+                if versao <= version:
+                    break
+                alteradas.append(spot)
+            return self.version, [self._spots[s] for s in sorted(alteradas)]
+
+    def __len__(self):
+        return len(self._spots)
+
+    def pending(self):
+        """Alterações adiadas até o COMMIT de uma transação (ver PendingChanges)"""
+        return PendingChanges(self)
+
+    def apply(self, spot, **campos):
+        """Aplica alterações a uma vaga e retorna o registro anterior"""
+        with self._lock:
+            anterior = self._spots.get(spot)
+            if anterior is None:
+                atual = _registro_vazio(spot)
+                insort(self._ordem, spot)
+            else:
+                atual = dict(anterior)
+            atual.update(campos)
+            self._spots[spot] = atual
+            self._snapshot = None
+            self.version += 1
+            self._changes[spot] = self.version
+            self._changes.move_to_end(spot)
+
+        for callback in self._listeners:
+            callback(anterior, atual)
+        return anterior
+
+
+class PendingChanges:
+    """Alterações de uma transação do banco ainda não confirmada.
+
+    ``get`` enxerga o store com as alterações pendentes e ``apply`` só as
+    registra; ``commit`` as aplica no store, na ordem, depois do COMMIT.
+    Assim os listeners (stream, emails, permanência) nunca veem uma
+    transição de um lote que o banco desfez.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._spots = {}       # {spot: registro com as alterações pendentes}
+        self._alteracoes = []  # [(spot, campos)], na ordem
+
+    def get(self, spot):
+        atual = self._spots.get(spot)
+        return atual if atual is not None else self._store.get(spot)
+
+    def apply(self, spot, **campos):
+        anterior = self.get(spot)
+        atual = dict(anterior) if anterior is not None else _registro_vazio(spot)
+        atual.update(campos)
+        self._spots[spot] = atual
+        self._alteracoes.append((spot, campos))
+        return anterior
+
+    def commit(self):
+        for spot, campos in self._alteracoes:
+            self._store.apply(spot, **campos)
+        self._alteracoes = []
+        self._spots = {}
@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import deque
+
+# ===============================
+# STREAM DE EVENTOS DAS VAGAS (SSE)
+# ===============================
+
+
+class SpotEventStream:
+    """Log circular de eventos compartilhado por todos os assinantes.
+
+    Publicar custa O(1) independente do número de clientes: o evento é
+    anexado ao buffer e os leitores acordam e leem a partir do próprio
+    cursor (o id do último evento recebido). Não existe fila nem thread
+    por cliente, e um cliente que reconecta recebe só o que perdeu.
+
+    Os ids enviados ao cliente são '<epoch>.<n>': o contador é do processo,
+    então um Last-Event-ID de outro epoch (restart ou outro worker) não
+    pode ser retomado e ``parse_id`` o descarta.
+    """
+
+    def __init__(self, max_events=1000, epoch=''):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=max_events)  # [(id, data_json)]
+        self._notifiers = []
+        self.epoch = epoch
+        self.last_id = 0
+
+    def event_id(self, cursor):
+        """Id SSE do cursor interno"""
+        return f'{self.epoch}.{cursor}'
+
+    def parse_id(self, event_id):
+        """Cursor interno de um Last-Event-ID, ou None se não for deste epoch"""
+        if not event_id:
+            return None
+        epoch, _, cursor = event_id.partition('.')
+        if epoch != self.epoch or not cursor.isdigit():
+            return None
+        return int(cursor)
+
+    def add_notifier(self, callback):
+        """callback() chamado após cada publicação (ex.: acordar um event loop)"""
+        self._notifiers.append(callback)
+
+    def publish(self, data):
+        """Adiciona um evento e acorda os assinantes; retorna o id"""
+        encoded = json.dumps(data, separators=(',', ':'))
+        with self._cond:
+            self.last_id += 1
+            self._events.append((self.last_id, encoded))
+            self._cond.notify_all()
+            event_id = self.last_id
+        for callback in self._notifiers:
+            callback()
+        return event_id
+
+    def since(self, last_id):
+        """Eventos posteriores a last_id, ou None se não há como retomar"""
+        with self._cond:
+            return self._since(last_id)
+
+    def wait(self, last_id, timeout=None):
+        """Bloqueia até existir evento posterior a last_id (ou timeout)"""
+        with self._cond:
+            if self.last_id == last_id:
+                self._cond.wait(timeout)
+            return self._since(last_id)
+
+    def _since(self, last_id):
+        if last_id > self.last_id:
+            # Id à frente do contador: não é deste processo
+            return None
+        if last_id == self.last_id:
+            return []
+        if not self._events or self._events[0][0] > last_id + 1:
+            # Eventos já descartados do buffer
+            return None
+        inicio = len(self._events) - (self.last_id - last_id)
+        return [self._events[i] for i in range(inicio, len(self._events))]
+
+
+def format_sse(data, event=None, event_id=None):
+    """Formata uma mensagem no protocolo text/event-stream"""
+    linhas = []
+    if event_id is not None:
+        linhas.append(f"id: {event_id}")
+    if event:
+        linhas.append(f"event: {event}")
+    linhas.append(f"data: {data}")
+    return '\n'.join(linhas) + '\n\n'
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+
+import history
+
+# ===============================
+# SINCRONIZAÇÃO ENTRE PROCESSOS
+# ===============================
+
+SYNC_INTERVAL = 0.25   # segundos entre consultas ao PRAGMA data_version
+SYNC_CHUNK = 500       # vagas por SELECT ... IN (...)
+
+SQL_SPOTS = ('SELECT spot, occupied, updated, distancia, last_distance_update '
+             'FROM spots WHERE spot IN ({})')
+
+
+class StoreRefresher:
+    """Mantém o SpotStore de um processo em dia com as escritas dos outros.
+
+    Uma conexão dedicada consulta ``PRAGMA data_version``, que só muda
+    quando outra conexão faz commit no arquivo. Quando muda, as vagas
+    tocadas são descobertas pelos eventos novos em ``spot_events`` (busca
+    pela chave primária) e só essas linhas são relidas e aplicadas ao
+    store. A leitura é um snapshot do WAL (BEGIN deferido), sem disputar o
+    lock de escrita com a ingestão; vagas que este processo alterou depois
+    do início do snapshot são puladas, então o store nunca recebe um
+    estado mais antigo do que um já aplicado localmente (a escrita local
+    gera um evento novo, e a próxima consulta relê a linha inteira).
+    """
+
+    def __init__(self, db, spot_store, interval=SYNC_INTERVAL):
+        self.db = db
+        self.spot_store = spot_store
+        self.interval = interval
+        self._conn = None
+        self._data_version = None
+        self._last_event = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.polls = 0
+        self.syncs = 0
+        self.spots_applied = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._conn = sqlite3.connect(self.db.path, timeout=self.db.busy_timeout,
+                                     isolation_level=None, check_same_thread=False)
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        with self.db.connection() as conn:
+            self._last_event = history.last_event_id(conn)
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='store-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # Inclusive erros de listeners: a thread não pode morrer
+                self.errors += 1
+                print(f"❌ Erro ao sincronizar vagas: {e}")
+
+    def poll(self):
+        """Sincroniza se houve commit de outra conexão desde a última consulta"""
+        self.polls += 1
+        versao = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if versao == self._data_version:
+            return 0
+        self._data_version = versao
+        return self.sync()
+
+    def sync(self):
+        # Versão antes do snapshot: o que mudar aqui depois dela é mais novo que ele
+        versao = self.spot_store.version
+        rows = []
+        with self.db.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                ultimo, spots = history.changed_spots(conn, self._last_event)
+                spots = sorted(spots)
+                for i in range(0, len(spots), SYNC_CHUNK):
+                    parte = spots[i:i + SYNC_CHUNK]
+                    rows.extend(conn.execute(
+                        SQL_SPOTS.format(','.join('?' * len(parte))), parte))
+            finally:
+                conn.execute('COMMIT')
+        self._last_event = ultimo
+        if not rows:
+            return 0
+
+        alteradas = self.spot_store.sync(rows, since_version=versao)
+        self.syncs += 1
+        self.spots_applied += alteradas
+        return alteradas
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'polls': self.polls,
+            'syncs': self.syncs,
+            'spots_applied': self.spots_applied,
+            'last_event_id': self._last_event,
+            'errors': self.errors
+        }
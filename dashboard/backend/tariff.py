@@ -0,0 +1,178 @@
+import math
+from datetime import datetime, timezone
+from itertools import chain
+
+# Cálculo vetorizado opcional: pip install numpy
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# ===============================
+# TARIFAÇÃO
+# ===============================
+
+MINUTOS_DIA = 1440
+
+# Equivalente ao preço original: R$ 10 + R$ 2 por hora completa
+DEFAULT_TARIFF = {
+    'base': 10.0,            # cobrado na entrada
+    'step_minutes': 60,      # tamanho do passo de cobrança
+    'step_rate': 2.0,        # valor de cada passo fora dos períodos especiais
+    'grace_minutes': 0,      # permanências até aqui não pagam nada
+    'daily_cap': None,       # teto por janela de 24 h desde a entrada
+    'round_up': False,       # True: cobra o passo iniciado; False: só os completos
+    'periods': []            # [{start: 'HH:MM', end: 'HH:MM', step_rate}]
+}
+
+
+def _minuto(hhmm):
+    horas, minutos = hhmm.split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+class Tariff:
+    """Tabela de preços configurável, com cálculo unitário e em lote.
+
+    Cada passo custa a tarifa do período em que começa. Como o passo
+    divide o dia, o padrão de tarifas se repete a cada 24 h: a soma dos
+    ``j`` primeiros passos para cada minuto de entrada é pré-calculada uma
+    vez (1440 x passos/dia), e o preço de qualquer permanência sai de duas
+    consultas nessa tabela — em Python puro para os endpoints ao vivo ou
+    com NumPy para milhares de permanências de uma vez.
+    """
+
+    def __init__(self, base=10.0, step_minutes=60, step_rate=2.0, grace_minutes=0,
+                 daily_cap=None, round_up=False, periods=()):
+        if step_minutes <= 0 or MINUTOS_DIA % step_minutes:
+            raise ValueError('step_minutes deve dividir 24 h (1440 minutos)')
+        self.base = float(base)
+        self.step_minutes = step_minutes
+        self.step_rate = float(step_rate)
+        self.grace_minutes = grace_minutes
+        self.daily_cap = float(daily_cap) if daily_cap is not None else None
+        self.round_up = round_up
+        self.periods = list(periods)
+
+        # Tarifa de um passo que começa em cada minuto do dia
+        taxas = [self.step_rate] * MINUTOS_DIA
+        for periodo in self.periods:
+            inicio, fim = _minuto(periodo['start']), _minuto(periodo['end'])
+            minutos = range(inicio, fim) if inicio < fim else chain(
+                range(inicio, MINUTOS_DIA), range(0, fim))
+            for minuto in minutos:
+                taxas[minuto] = float(periodo['step_rate'])
+
+        # _acumulado[m0][j]: soma dos j primeiros passos entrando no minuto m0
+        self._passos_dia = MINUTOS_DIA // step_minutes
+        self._acumulado = []
+        for m0 in range(MINUTOS_DIA):
+            linha = [0.0]
+            for j in range(self._passos_dia):
+                linha.append(linha[-1] + taxas[(m0 + j * step_minutes) % MINUTOS_DIA])
+            self._acumulado.append(linha)
+        self._tabela = np.array(self._acumulado) if NUMPY_AVAILABLE else None
+
+    @classmethod
+    def from_config(cls, config):
+        """Monta a tarifa a partir da seção 'tariff' do frontend_config.json"""
+        return cls(**dict(DEFAULT_TARIFF, **config.get('tariff', {})))
+
+    def _teto(self, valor):
+        return valor if self.daily_cap is None else min(valor, self.daily_cap)
+
+    def price(self, inicio, fim):
+        """Preço de uma permanência entre dois datetimes (horário local)"""
+        segundos = (fim - inicio).total_seconds()
+        if self.grace_minutes and segundos <= self.grace_minutes * 60:
+            return 0.0
+        passos = max(0.0, segundos / (self.step_minutes * 60))
+        passos = math.ceil(passos) if self.round_up else int(passos)
+
+        linha = self._acumulado[inicio.hour * 60 + inicio.minute]
+        dias, resto = divmod(passos, self._passos_dia)
+        cheio = linha[self._passos_dia]
+        if dias == 0:
+            return round(self._teto(self.base + linha[resto]), 2)
+        total = (self._teto(self.base + cheio) + (dias - 1) * self._teto(cheio)
+                 + self._teto(linha[resto]))
+        return round(total, 2)
+
+    def price_many(self, entradas, saidas, utc_offset=0):
+        """Preços de muitas permanências (epoch em segundos) de uma vez"""
+        if not NUMPY_AVAILABLE:
+            return [self.price(datetime.fromtimestamp(e), datetime.fromtimestamp(s))
+                    for e, s in zip(entradas, saidas)]
+
+        entradas = np.asarray(entradas, dtype=np.int64)
+        duracao = np.maximum(np.asarray(saidas, dtype=np.int64) - entradas, 0)
+        passo = self.step_minutes * 60
+        passos = -(-duracao // passo) if self.round_up else duracao // passo
+
+        m0 = ((entradas + utc_offset) % 86400) // 60
+        dias, resto = np.divmod(passos, self._passos_dia)
+        cheio = self._tabela[m0, self._passos_dia]
+        parcial = self._tabela[m0, resto]
+        teto = np.inf if self.daily_cap is None else self.daily_cap
+
+        total = np.where(
+            dias == 0,
+            np.minimum(self.base + parcial, teto),
+            np.minimum(self.base + cheio, teto)
+            + np.maximum(dias - 1, 0) * np.minimum(cheio, teto)
+            + np.minimum(parcial, teto))
+        if self.grace_minutes:
+            total = np.where(duracao <= self.grace_minutes * 60, 0.0, total)
+        return np.round(total, 2)
+
+    def describe(self):
+        return {
+            'base': self.base,
+            'step_minutes': self.step_minutes,
+            'step_rate': self.step_rate,
+            'grace_minutes': self.grace_minutes,
+            'daily_cap': self.daily_cap,
+            'round_up': self.round_up,
+            'periods': self.periods
+        }
+
+
+def _agrupar(chaves, valores):
+    """[(chave, soma, contagem)] ordenado por chave"""
+    if NUMPY_AVAILABLE:
+        unicas, indices = np.unique(np.asarray(chaves), return_inverse=True)
+        somas = np.bincount(indices, weights=valores)
+        contagens = np.bincount(indices)
+        return [(int(k), float(s), int(c)) for k, s, c in zip(unicas, somas, contagens)]
+
+    grupos = {}
+    for chave, valor in zip(chaves, valores):
+        soma, contagem = grupos.get(chave, (0.0, 0))
+        grupos[chave] = (soma + valor, contagem + 1)
+    return [(k, s, c) for k, (s, c) in sorted(grupos.items())]
+
+
+def revenue_report(tariff, stays, utc_offset=0):
+    """Receita das permanências [(spot, entrada, saida)] por dia (da saída) e por vaga"""
+    if not stays:
+        return {'total': 0.0, 'stays': 0, 'by_day': [], 'by_spot': []}
+
+    spots, entradas, saidas = zip(*stays)
+    valores = tariff.price_many(entradas, saidas, utc_offset)
+    dias = [(saida + utc_offset) // 86400 for saida in saidas]
+
+    return {
+        'total': round(float(sum(valores)), 2),
+        'stays': len(stays),
+        'by_day': [{
+            'day': datetime.fromtimestamp(dia * 86400, timezone.utc).date().isoformat(),
+            'revenue': round(soma, 2),
+            'stays': contagem
+        } for dia, soma, contagem in _agrupar(dias, valores)],
+        'by_spot': [{
+            'spot': spot,
+            'revenue': round(soma, 2),
+            'stays': contagem
+        } for spot, soma, contagem in _agrupar(spots, valores)]
+    }
@@ -0,0 +1,238 @@
+import json
+from datetime import datetime
+
+import binary_payload
+from metrics import log_event
+
+# ===============================
+# ROTEADOR DE TÓPICOS MQTT
+# ===============================
+
+SITUACAO_OCUPADA = {'ocupada', 'ocupado', 'occupied', '1'}
+SITUACAO_LIVRE = {'liberada', 'liberado', 'livre', 'free', '0'}
+
+# Rotas equivalentes ao comportamento original (usadas se o config não tiver)
+DEFAULT_ROUTES = [
+    {'topic': '/vaga1/status', 'spot': 1, 'parser': 'esp32_json'},
+    {'topic': '/vaga2/status', 'spot': 2, 'parser': 'esp32_json'},
+    {'topic': 'vaga/+/status', 'parser': 'status'},
+    {'topic': 'vaga/+/distancia', 'parser': 'distancia'},
+]
+DEFAULT_SPOT_PREFIX = 'A'
+
+
+def normalizar_situacao(valor):
+    """True (ocupada), False (livre) ou None se não reconhecida"""
+    if not isinstance(valor, str):
+        return None
+    valor = valor.lower().strip()
+    if valor in SITUACAO_OCUPADA:
+        return True
+    if valor in SITUACAO_LIVRE:
+        return False
+    return None
+
+
+def timestamp_local(valor):
+    """Timestamp ISO em horário local sem fuso (como o resto do banco).
+
+    Timestamps com offset ('Z', '+00:00', ...) são convertidos para o fuso
+    local; TypeError/ValueError se ``valor`` não for um ISO válido.
+    """
+    momento = datetime.fromisoformat(valor)
+    if momento.tzinfo is not None:
+        momento = momento.astimezone().replace(tzinfo=None)
+    return momento.isoformat()
+
+
+def normalizar_timestamp(valor):
+    """(timestamp ISO, é o horário de chegada?) do payload.
+
+    O ESP32 envia 'N/A' quando não tem NTP; aí vale o horário de chegada,
+    que não serve como evidência de reinício do sensor (ver reading_guard).
+    """
+    if isinstance(valor, str):
+        try:
+            return timestamp_local(valor), False
+        except ValueError:
+            pass
+    return datetime.now().isoformat(), True
+
+
+# -------- Parsers de payload: (spot, payload bytes) -> leitura | None --------
+
+def parse_esp32_json(spot, payload):
+    """JSON do firmware: {situacao, distancia_atual, timestamp}"""
+    data = json.loads(payload.decode())
+    situacao = data.get('situacao', '')
+    ocupado = normalizar_situacao(situacao)
+    if ocupado is None and isinstance(situacao, str):
+        log_event('situacao_desconhecida',
+                  f"⚠️ Situacao '{situacao}' não reconhecida, usando distância",
+                  spot=spot, situacao=situacao)
+
+    # Sem 'situacao' reconhecida, o filtro do sensor decide pela distância
+    seq = data.get('seq')
+    timestamp, chegada = normalizar_timestamp(data.get('timestamp'))
+    return {
+        'spot': spot,
+        'occupied': ocupado,
+        'distancia': data.get('distancia_atual', 0),
+        'timestamp': timestamp,
+        'timestamp_chegada': chegada,
+        'seq': seq if isinstance(seq, int) and not isinstance(seq, bool) else None
+    }
+
+
+def parse_status(spot, payload):
+    """Status em texto puro: ocupada/livre/1/0"""
+    ocupado = normalizar_situacao(payload.decode())
+    if ocupado is None:
+        log_event('status_desconhecido',
+                  f"⚠️ Status desconhecido para vaga {spot}: {payload.decode()}",
+                  spot=spot, payload=payload.decode())
+        return None
+    return {'spot': spot, 'occupied': ocupado, 'distancia': None, 'timestamp': None}
+
+
+def parse_distancia(spot, payload):
+    """Distância em texto puro"""
+    try:
+        distancia = float(payload.decode())
+    except ValueError:
+        log_event('distancia_invalida',
+                  f"⚠️ Distância inválida para vaga {spot}: {payload.decode()}",
+                  spot=spot, payload=payload.decode())
+        return None
+    return {'spot': spot, 'occupied': None, 'distancia': distancia, 'timestamp': None}
+
+
+def parse_binary(spot, payload):
+    """Registros binários de 16 bytes (ver binary_payload)"""
+    return binary_payload.decode(spot, payload)
+
+
+PARSERS = {
+    'esp32_json': parse_esp32_json,
+    'status': parse_status,
+    'distancia': parse_distancia,
+    'binary': parse_binary,
+}
+
+
+class TopicRouter:
+    """Tabela de despacho compilada a partir da configuração.
+
+    Tópicos exatos ficam num dict {topic: (spot, parser)}. Padrões com um
+    ``+`` (o nome da vaga) são agrupados por formato: para cada formato
+    a chave é o tópico sem o segmento curinga, e o segmento capturado é
+    resolvido para o número da vaga por outro dict. O custo por mensagem
+    depende só da quantidade de formatos configurados, não de vagas.
+
+    Payloads que começam com o header binário (ver binary_payload) são
+    decodificados como binário em qualquer rota; rotas exatas com parser
+    'binary' podem omitir 'spot' (a vaga vem de cada registro).
+    """
+
+    def __init__(self, routes=DEFAULT_ROUTES, spots=None, spot_prefix=DEFAULT_SPOT_PREFIX):
+        self._exact = {}
+        self._shapes = {}  # {(n_segmentos, posição_do_+): {chave: parser}}
+        self._names = dict(spots or {})
+        self._prefix = spot_prefix
+        self._subscriptions = []
+
+        for route in routes:
+            parser = route.get('parser')
+            if parser not in PARSERS:
+                raise ValueError(f"Parser desconhecido na rota {route}")
+            topic = route['topic']
+            self._subscriptions.append(topic)
+
+            parts = topic.split('/')
+            curingas = [i for i, p in enumerate(parts) if p in ('+', '#')]
+            if not curingas:
+                if 'spot' in route:
+                    self._exact[topic] = (int(route['spot']), parser)
+                elif parser == 'binary':
+                    # Gateway: a vaga vem de cada registro do payload
+                    self._exact[topic] = (None, parser)
+                else:
+                    raise ValueError(f"Rota exata sem 'spot': {route}")
+            elif len(curingas) == 1 and parts[curingas[0]] == '+':
+                pos = curingas[0]
+                chave = tuple(parts[:pos] + parts[pos + 1:])
+                self._shapes.setdefault((len(parts), pos), {})[chave] = parser
+            else:
+                raise ValueError(f"Só um '+' (nome da vaga) é suportado: {topic}")
+
+    @classmethod
+    def from_config(cls, config, names=None):
+        """Monta o roteador a partir da seção 'mqtt' do frontend_config.json
+
+        ``names`` ({nome: vaga}, ex.: os nomes do layout) vale para os nomes
+        que a seção 'mqtt.spots' não redefine. Com ``names``, só esses nomes
+        são resolvidos: sem o fallback prefixo + número, 'A203' não vira a
+        vaga 203 de outra zona.
+        """
+        mqtt_config = config.get('mqtt', {})
+        prefixo = None
+        if names is None:
+            prefixo = mqtt_config.get('spot_prefix', DEFAULT_SPOT_PREFIX)
+        return cls(routes=mqtt_config.get('routes', DEFAULT_ROUTES),
+                   spots=dict(names or {}, **mqtt_config.get('spots', {})),
+                   spot_prefix=prefixo)
+
+    def subscriptions(self):
+        return list(self._subscriptions)
+
+    def dedicated_spots(self):
+        """Vagas com tópico exato próprio (um ESP32 dedicado)"""
+        return {spot for spot, _ in self._exact.values() if spot is not None}
+
+    def spot_for_name(self, nome):
+        """'A12' -> 12 (mapa explícito do config ou prefixo + número)"""
+        spot = self._names.get(nome)
+        if spot is not None:
+            return spot
+        if self._prefix is not None and nome.startswith(self._prefix) and nome[len(self._prefix):].isdigit():
+            return int(nome[len(self._prefix):])
+        return None
+
+    def resolve(self, topic):
+        """(spot, nome_do_parser) para o tópico, ou None"""
+        rota = self._exact.get(topic)
+        if rota is not None:
+            return rota
+
+        parts = topic.split('/')
+        for (n, pos), tabela in self._shapes.items():
+            if len(parts) != n:
+                continue
+            parser = tabela.get(tuple(parts[:pos] + parts[pos + 1:]))
+            if parser is not None:
+                spot = self.spot_for_name(parts[pos])
+                if spot is not None:
+                    return spot, parser
+        return None
+
+    def parse(self, topic, payload):
+        """Converte a mensagem em leituras {spot, occupied, distancia, timestamp}"""
+        return self.parse_route(self.resolve(topic), payload)
+
+    @staticmethod
+    def parser_for(rota, payload):
+        """Parser efetivo: o header binário vale em qualquer rota"""
+        if rota is None:
+            return None
+        return 'binary' if binary_payload.is_binary(payload) else rota[1]
+
+    @staticmethod
+    def parse_route(rota, payload):
+        """Como ``parse``, para uma rota já resolvida"""
+        parser = TopicRouter.parser_for(rota, payload)
+        if parser is None:
+            return []
+        if parser == 'binary':
+            return binary_payload.decode(rota[0], payload)
+        leitura = PARSERS[parser](rota[0], payload)
+        return [leitura] if leitura is not None else []
@@ -33,6 +33,36 @@ export default function App() {
   const historyRef = useRef({})
   const [totalSeries, setTotalSeries] = useState([])
 
+  const applySpots = (spots, replace) => {
+    setVagas(prev => {
+      // replace: lista completa (snapshot); senão só as vagas alteradas
+      const vagasData = replace ? {} : { ...prev }
+      spots.forEach(spot => {
+        // Preserva statusChangeTime existente se a vaga já existe e o status não mudou
+        const currentVaga = prev[spot.nome]
+        const newStatus = spot.status
+        
+        let statusChangeTime
+        if (currentVaga && currentVaga.status === newStatus) {
+          // Status não mudou, mantém o tempo anterior
+          statusChangeTime = currentVaga.statusChangeTime
+        } else {
+          // Status mudou ou é nova vaga, define tempo atual
+          statusChangeTime = Date.now()
+        }
+          
+        vagasData[spot.nome] = {
+          status: newStatus,
+          lastUpdate: Date.now(),
+          statusChangeTime: statusChangeTime,
+          distancia: spot.distancia,
+          esp32_controlled: spot.esp32_controlled
+        }
+      })
+      return vagasData
+    })
+  }
+
   const fetchVagasFromAPI = async () => {
     try {
       const response = await fetch(`${API_BASE}/api/spots`)
@@ -43,32 +73,7 @@ export default function App() {
         setLoading(false)
         
         // Converte formato do backend para formato do frontend
-        setVagas(prev => {
-          const vagasData = {}
-          spots.forEach(spot => {
-            // Preserva statusChangeTime existente se a vaga já existe e o status não mudou
-            const currentVaga = prev[spot.nome]
-            const newStatus = spot.status
-            
-            let statusChangeTime
-            if (currentVaga && currentVaga.status === newStatus) {
-              // Status não mudou, mantém o tempo anterior
-              statusChangeTime = currentVaga.statusChangeTime
-            } else {
-              // Status mudou ou é nova vaga, define tempo atual
-              statusChangeTime = Date.now()
-            }
-              
-            vagasData[spot.nome] = {
-              status: newStatus,
-              lastUpdate: Date.now(),
-              statusChangeTime: statusChangeTime,
-              distancia: spot.distancia,
-              esp32_controlled: spot.esp32_controlled
-            }
-          })
-          return vagasData
-        })
+        applySpots(spots, true)
         addLog(`Dados carregados do backend: ${spots.length} vagas`)
         
         return spots
@@ -85,16 +90,39 @@ export default function App() {
 
 
 
+  // Pré-carrega o histórico por hora (últimos 7 dias) para sparklines e heatmap
+  const loadHistoryFromAPI = async (spots) => {
+    const start = new Date(Date.now() - 7 * 24 * 3600 * 1000).toISOString()
+    await Promise.all(spots.map(async (spot) => {
+      try {
+        const response = await fetch(`${API_BASE}/api/history/${spot.id}?bucket=hour&start=${start}`)
+        if (!response.ok) return
+        const { series } = await response.json()
+        const pontos = series
+          .filter((p) => p.occupancy_rate !== null)
+          .map((p) => ({ t: Date.parse(p.t), y: p.occupancy_rate / 100 }))
+        historyRef.current[spot.nome] = [...pontos, ...(historyRef.current[spot.nome] || [])].slice(-500)
+      } catch (e) {
+      }
+    }))
+  }
+
   useEffect(() => {
     // Primeira busca dos dados do backend
-    fetchVagasFromAPI()
+    fetchVagasFromAPI().then((spots) => spots && loadHistoryFromAPI(spots))
     
-    // Atualiza dados do backend a cada 30 segundos
-    const apiInterval = setInterval(() => {
-      fetchVagasFromAPI()
-    }, 30000)
+    // Recebe as mudanças por push (SSE) em vez de polling; o navegador
+    // reconecta sozinho enviando o Last-Event-ID e recebe só o que perdeu
+    const stream = new EventSource(`${API_BASE}/api/stream`)
+    stream.addEventListener('snapshot', (e) => applySpots(JSON.parse(e.data), true))
+    stream.addEventListener('spot', (e) => applySpots([JSON.parse(e.data)], false))
+    stream.onopen = () => setApiConnected(true)
+    stream.onerror = () => {
+      setApiConnected(false)
+      addLog('Stream da API desconectado, reconectando...')
+    }
     
-    return () => clearInterval(apiInterval)
+    return () => stream.close()
   }, [])
 
   useEffect(() => {
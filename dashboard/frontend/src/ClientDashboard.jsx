@@ -25,6 +25,33 @@ export default function ClientDashboard() {
   const [clientSession, setClientSession] = useState(null) // { vagaId, startTime, totalPago }
   const clientRef = useRef(null)
   
+  const applySpots = (spots, replace) => {
+    setVagas(prev => {
+      // replace: lista completa (snapshot); senão só as vagas alteradas
+      const vagasData = replace ? {} : { ...prev }
+      spots.forEach(spot => {
+        const currentVaga = prev[spot.nome]
+        const newStatus = spot.status
+        
+        let statusChangeTime
+        if (currentVaga && currentVaga.status === newStatus) {
+          statusChangeTime = currentVaga.statusChangeTime
+        } else {
+          statusChangeTime = Date.now()
+        }
+          
+        vagasData[spot.nome] = {
+          status: newStatus,
+          lastUpdate: Date.now(),
+          statusChangeTime: statusChangeTime,
+          distancia: spot.distancia,
+          esp32_controlled: spot.esp32_controlled
+        }
+      })
+      return vagasData
+    })
+  }
+
   const fetchVagasFromAPI = async () => {
     try {
       const response = await fetch(`${API_BASE}/api/spots`)
@@ -33,29 +60,7 @@ export default function ClientDashboard() {
         const spots = await response.json()
         setLoading(false)
         
-        setVagas(prev => {
-          const vagasData = {}
-          spots.forEach(spot => {
-            const currentVaga = prev[spot.nome]
-            const newStatus = spot.status
-            
-            let statusChangeTime
-            if (currentVaga && currentVaga.status === newStatus) {
-              statusChangeTime = currentVaga.statusChangeTime
-            } else {
-              statusChangeTime = Date.now()
-            }
-              
-            vagasData[spot.nome] = {
-              status: newStatus,
-              lastUpdate: Date.now(),
-              statusChangeTime: statusChangeTime,
-              distancia: spot.distancia,
-              esp32_controlled: spot.esp32_controlled
-            }
-          })
-          return vagasData
-        })
+        applySpots(spots, true)
         
         return spots
       } else {
@@ -70,11 +75,13 @@ export default function ClientDashboard() {
   useEffect(() => {
     fetchVagasFromAPI()
     
-    const apiInterval = setInterval(() => {
-      fetchVagasFromAPI()
-    }, 30000)
+    // Recebe as mudanças por push (SSE) em vez de polling; o navegador
+    // reconecta sozinho enviando o Last-Event-ID e recebe só o que perdeu
+    const stream = new EventSource(`${API_BASE}/api/stream`)
+    stream.addEventListener('snapshot', (e) => applySpots(JSON.parse(e.data), true))
+    stream.addEventListener('spot', (e) => applySpots([JSON.parse(e.data)], false))
     
-    return () => clearInterval(apiInterval)
+    return () => stream.close()
   }, [])
 
   useEffect(() => {
@@ -24,6 +24,17 @@ const char* TOPIC_EST = "/vaga1/status";
 #define PERNA_AZUL 25   // Pino para LED azul
 #define THRESHOLD_CHANGE 200     // Limiar para considerar mudança drástica
 #define THRESHOLD_OCUPADO 3860    // Valor abaixo disso = vaga ocupada (objeto próximo)
+#define HEARTBEAT_MS 60000       // Reenvia o estado atual sem mudança (backend detecta sensor parado)
+#define PAYLOAD_BINARIO 0        // 1: registro binário de 16 bytes em vez de JSON
+
+// Registro binário (dashboard/backend/binary_payload.py), little-endian:
+// header, flags, vaga, distância, timestamp (epoch UTC), sequência
+#define BINARIO_HEADER 0xB1
+#define FLAG_OCUPADA 0x01
+#define FLAG_ESTADO 0x02
+#define FLAG_DISTANCIA 0x04
+#define FLAG_SEQ 0x08
+const uint32_t SPOT_ID = 0;      // 0 = vaga da rota do tópico no backend
 
 // Variável compartilhada para armazenar a distância
 volatile int distancia = 0;
@@ -33,6 +44,9 @@ volatile bool vagaOcupada = false;
 // Semáforo para proteger o acesso à variável compartilhada
 SemaphoreHandle_t xSemaphore;
 
+// Sequência das mensagens (o backend descarta repetidas e atrasadas)
+uint32_t seqEnvio = 0;
+
 void ensureWifi(){
     // Conecta ao WiFi
   Serial.print("Conectando ao WiFi");
@@ -138,10 +152,62 @@ void taskLerSensor(void *pvParameters) {
   }
 }
 
+// Publica o estado da vaga no tópico do ESP32
+void publicarEstado(const String& situacao, int distanciaAtual, int diferenca) {
+  uint32_t seq = ++seqEnvio;
+
+#if PAYLOAD_BINARIO
+  // 16 bytes por leitura, sem JSON para montar nem para o backend decodificar
+  uint8_t registro[16];
+  time_t agora = time(nullptr);
+  uint32_t timestamp = agora > 1600000000 ? (uint32_t) agora : 0;  // 0 = sem NTP
+  uint16_t distancia16 = (uint16_t) constrain(distanciaAtual, 0, 65535);
+  registro[0] = BINARIO_HEADER;
+  registro[1] = FLAG_ESTADO | FLAG_DISTANCIA | FLAG_SEQ |
+                (situacao == "ocupada" ? FLAG_OCUPADA : 0);
+  memcpy(&registro[2], &SPOT_ID, 4);
+  memcpy(&registro[6], &distancia16, 2);
+  memcpy(&registro[8], &timestamp, 4);
+  memcpy(&registro[12], &seq, 4);
+  String payload = situacao + " (binário, seq " + String(seq) + ")";
+#else
+  // Obtém o timestamp atual
+  String timestamp = getTimestamp();
+
+  // Monta payload para enviar ao backend
+  String payload = "{ \"situacao\": \"" + situacao + "\"" +
+                   ", \"distancia_atual\": " + String(distanciaAtual) +
+                   ", \"diferenca\": " + String(diferenca) +
+                   ", \"seq\": " + String(seq) +
+                   ", \"timestamp\": \"" + timestamp + "\" }";
+#endif
+
+  // Verifica se WiFi e MQTT estão conectados antes de publicar
+  if (WiFi.status() == WL_CONNECTED) {
+    ensureMqtt();
+    mqtt.loop();
+
+#if PAYLOAD_BINARIO
+    bool ok = mqtt.publish(TOPIC_EST, registro, sizeof(registro));
+#else
+    bool ok = mqtt.publish(TOPIC_EST, payload.c_str());
+#endif
+    if (ok) {
+      Serial.println("Mensagem MQTT publicada com sucesso:");
+      Serial.println(payload);
+    } else {
+      Serial.println("Falha ao publicar mensagem MQTT.");
+    }
+  } else {
+    Serial.println("[AVISO] WiFi desconectado. Mensagem não enviada:");
+    Serial.println(payload);
+  }
+}
+
 // Task 2: Monitora mudanças drásticas na distância
 void taskMonitorarMudanca(void *pvParameters) {
   String situacao;
-  String payload;
+  unsigned long ultimoEnvio = 0;
   (void) pvParameters;
   
   // Aguarda um pouco para a primeira leitura do sensor
@@ -150,11 +216,13 @@ void taskMonitorarMudanca(void *pvParameters) {
   while (1) {
     int distanciaAtual = 0;
     int distanciaPrevia = 0;
+    bool ocupada = false;
     
     // Protege o acesso à variável compartilhada
     if (xSemaphoreTake(xSemaphore, pdMS_TO_TICKS(100)) == pdTRUE) {
       distanciaAtual = distancia;
       distanciaPrevia = distanciaAnterior;
+      ocupada = vagaOcupada;
       xSemaphoreGive(xSemaphore);
     } else {
       vTaskDelay(pdMS_TO_TICKS(50));
@@ -174,31 +242,18 @@ void taskMonitorarMudanca(void *pvParameters) {
         situacao = "liberada";
       }
 
-      // Obtém o timestamp atual
-      String timestamp = getTimestamp();
-      
-      // Monta payload para enviar ao backend
-      payload = "{ \"situacao\": \"" + situacao + 
-                ", \"distancia_atual\": " + String(distanciaAtual) +
-                ", \"diferenca\": " + String(diferenca) +
-                ", \"timestamp\": \"" + timestamp + "\" }";
-    
-      // Verifica se WiFi e MQTT estão conectados antes de publicar
-      if (WiFi.status() == WL_CONNECTED) {
-        ensureMqtt();
-        mqtt.loop();
-        
-        bool ok = mqtt.publish(TOPIC_EST, payload.c_str());
-        if (ok) {
-          Serial.println("Mensagem MQTT publicada com sucesso:");
-          Serial.println(payload);
-        } else {
-          Serial.println("Falha ao publicar mensagem MQTT.");
-        }
-      } else {
-        Serial.println("[AVISO] WiFi desconectado. Mensagem não enviada:");
-        Serial.println(payload);
+      publicarEstado(situacao, distanciaAtual, diferenca);
+      ultimoEnvio = millis();
+    } else if (millis() - ultimoEnvio >= HEARTBEAT_MS) {
+      // Heartbeat: mesmo sem mudança, o backend sabe que o sensor está vivo.
+      // Reenvia a última situação publicada (a regra do limiar absoluto pode
+      // discordar da regra da diferença e desfaria a transição a cada envio);
+      // só antes da primeira mudança vale o limiar
+      if (situacao.length() == 0) {
+        situacao = ocupada ? "ocupada" : "liberada";
       }
+      publicarEstado(situacao, distanciaAtual, 0);
+      ultimoEnvio = millis();
     }
 
     if (xSemaphoreTake(xSemaphore, pdMS_TO_TICKS(100)) == pdTRUE) {